@@ -1,16 +1,31 @@
+import argparse
+import random
+import sys
+import time
+
 # ---------------------------------------------------------------
 # GLOBALS
 # ---------------------------------------------------------------
 
-RED = "red"
-BLACK = "black"
+# Node colors, stored as a single int per node
+RED = 1
+BLACK = 0
+
+# T.nil of the trees made of each kind of node. Trees share it so that they can be joined without touching every leaf,
+# which is why nothing ever writes to T.nil: the fields of a node may only be set on real nodes.
+NIL_NODES = {}
 
 # ---------------------------------------------------------------
 # CLASSES
 # ---------------------------------------------------------------
 
 
-class node:
+# Nodes have a fixed set of attributes (__slots__) instead of a __dict__ each, which cuts the memory per node by more
+# than half. The getters and setters are kept for callers, while the hot loops of the tree read the attributes
+# directly.
+class node(object):
+    __slots__ = ("key", "parent", "left", "right", "color", "size")
+
     def get_left(self):
         return self.left
 
@@ -41,30 +56,157 @@ class node:
     def set_key(self, newKey):
         self.key = newKey
 
+    def get_size(self):
+        return self.size
+
+    def set_size(self, newSize):
+        self.size = newSize
+
     def __init__(self, key):
         self.key = key
         self.parent = None
         self.left = None
         self.right = None
         self.color = BLACK
+        # number of keys in the subtree rooted at this node, 0 for T.nil
+        self.size = 1
 
 
 class tree(object):
     def __init__(self, createNode=node):
-        self.nil = createNode(None)  # T.nil
+        self.nil = nil_node(createNode)  # T.nil
         self.root = self.nil
         self.create_node = createNode
 
-    def sort(self, x=None):
+    def __len__(self):
+        return self.root.size
+
+    def empty(self):
+        """ Return an empty tree of the same kind and with the same settings as this one. """
+        t = object.__new__(self.__class__)
+        t.__dict__.update(self.__dict__)
+        t.root = self.nil
+        return t
+
+    @classmethod
+    def from_sorted(cls, keys, createNode=None):
+        """
+        Build a tree holding the keys, which must be in sorted order, in O(n) without any rotation.
+        """
+        keys = list(keys)
+        for i in range(1, len(keys)):
+            if keys[i] < keys[i - 1]:
+                raise ValueError("keys are not sorted")
+        t = cls() if createNode is None else cls(createNode=createNode)
+
+        # The middle key of every range becomes the root of its subtree, so every level is full except the deepest
+        # one. Coloring the nodes of that level red and all others black gives the same black height to every path.
+        full_levels = (len(keys) + 1).bit_length() - 1
+
+        def build(lo, hi, depth, parent):
+            if lo >= hi:
+                return t.nil
+            mid = (lo + hi) // 2
+            x = t.create_node(keys[mid])
+            x.set_parent(parent)
+            x.set_color(RED if depth == full_levels else BLACK)
+            x.set_left(build(lo, mid, depth + 1, x))
+            x.set_right(build(mid + 1, hi, depth + 1, x))
+            x.set_size(hi - lo)
+            return x
+
+        t.root = build(0, len(keys), 0, t.nil)
+        return t
+
+    def black_height(self, x=None):
+        """ Number of black nodes on any path from x (included) down to a leaf. """
         if x is None:
             x = self.root
+        h = 0
+        while x != self.nil:
+            if x.get_color() == BLACK:
+                h += 1
+            x = x.get_left()
+        return h
+
+    def subtree(self, x):
+        """ Detach the subtree rooted at x and return it as a tree. """
+        t = self.empty()
+        t.root = x
         if x != self.nil:
-            self.sort(x.get_left())
-            print x.get_key()
-            self.sort(x.get_right())
+            x.set_parent(self.nil)
+        return t
 
-    def successor(self, key):
-        x = self.search(key)
+    def split(self, key):
+        """
+        Split the tree into a tree with the keys < key and a tree with the keys >= key, in O(log n). This tree is left
+        empty.
+        """
+        left, left_height, right, right_height = self.split_subtree(self.root, self.black_height(), key)
+        self.root = self.nil
+        return left, right
+
+    def split_subtree(self, x, h, key):
+        # Split the subtree rooted at x, whose black height is h, and return both parts with their black heights. Going
+        # down the search path for key, every node is joined with its subtree on the other side of the path to the
+        # part returned for its child. The black heights passed down keep every join proportional to the difference
+        # in height of the trees it joins, and these differences add up to O(log n).
+        if x == self.nil:
+            return self.empty(), 0, self.empty(), 0
+        child_height = h - 1 if x.get_color() == BLACK else h
+        left = self.subtree(x.get_left())
+        right = self.subtree(x.get_right())
+        if x.get_key() < key:
+            rest, rest_height, right, right_height = self.split_subtree(right.root, child_height, key)
+            left, left_height = join_at(left, x, rest, child_height, rest_height)
+        else:
+            left, left_height, rest, rest_height = self.split_subtree(left.root, child_height, key)
+            right, right_height = join_at(rest, x, right, rest_height, child_height)
+        return left, left_height, right, right_height
+
+    def sort(self, x=None):
+        for key in self.inorder_iter(x):
+            print key
+
+    def __iter__(self):
+        return self.inorder_iter()
+
+    def inorder_iter(self, x=None):
+        """
+        Yield the keys of the subtree rooted at x (the whole tree by default) in sorted order.
+        """
+        # The explicit stack holds the nodes whose left subtree is being visited, so the depth of the tree is not
+        # limited by the recursion limit. The tree must not be changed while the keys are read.
+        if x is None:
+            x = self.root
+        stack = []
+        while stack or x != self.nil:
+            if x != self.nil:
+                stack.append(x)
+                x = x.get_left()
+            else:
+                x = stack.pop()
+                yield x.get_key()
+                x = x.get_right()
+
+    def reverse_iter(self, x=None):
+        """
+        Yield the keys of the subtree rooted at x (the whole tree by default) in reverse sorted order.
+        """
+        if x is None:
+            x = self.root
+        stack = []
+        while stack or x != self.nil:
+            if x != self.nil:
+                stack.append(x)
+                x = x.get_right()
+            else:
+                x = stack.pop()
+                yield x.get_key()
+                x = x.get_left()
+
+    def next_node(self, x):
+        """ Return the node which follows x in sorted order, or T.nil. """
         if x.get_right() != self.nil:
             return self.min(x.get_right())
         y = x.get_parent()
@@ -73,8 +215,8 @@ class tree(object):
             y = y.get_parent()
         return y
 
-    def predecessor(self, key):
-        x = self.search(key)
+    def prev_node(self, x):
+        """ Return the node which precedes x in sorted order, or T.nil. """
         if x.get_left() != self.nil:
             return self.max(x.get_left())
         y = x.get_parent()
@@ -83,31 +225,170 @@ class tree(object):
             y = y.get_parent()
         return y
 
+    def iter_from(self, key, reverse=False):
+        """
+        Yield the keys >= key in sorted order, or the keys <= key in reverse sorted order if reverse is set.
+        """
+        # Find the first node to report in one descent, then step through the parent pointers, which costs O(1)
+        # amortized per key
+        y = self.nil
+        x = self.root
+        while x != self.nil:
+            if (not reverse and x.get_key() < key) or (reverse and key < x.get_key()):
+                x = x.get_left() if reverse else x.get_right()
+            else:
+                y = x
+                x = x.get_right() if reverse else x.get_left()
+        while y != self.nil:
+            yield y.get_key()
+            y = self.prev_node(y) if reverse else self.next_node(y)
+
+    def successor(self, key):
+        """
+        Return the node with the smallest key greater than key, or T.nil. The key itself need not be in the tree.
+        """
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            if key < x.key:
+                y = x
+                x = x.left
+            else:
+                x = x.right
+        return y
+
+    def predecessor(self, key):
+        """
+        Return the node with the greatest key less than key, or T.nil. The key itself need not be in the tree.
+        """
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            if x.key < key:
+                y = x
+                x = x.right
+            else:
+                x = x.left
+        return y
+
+    def floor(self, key):
+        """
+        Return a node with the greatest key less than or equal to key, or T.nil.
+        """
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            k = x.key
+            if key < k:
+                x = x.left
+            else:
+                y = x
+                if key == k:
+                    break
+                x = x.right
+        return y
+
+    def ceiling(self, key):
+        """
+        Return a node with the smallest key greater than or equal to key, or T.nil.
+        """
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            k = x.key
+            if k < key:
+                x = x.right
+            else:
+                y = x
+                if key == k:
+                    break
+                x = x.left
+        return y
+
     def search(self, key, x=None):
         # x represents the root of the tree
         if x is None:
             x = self.root
-        while x != self.nil and key != x.get_key():
-            if key < x.get_key():
-                x = x.get_left()
-            else:
-                x = x.get_right()
+        nil = self.nil
+        while x is not nil:
+            k = x.key
+            if key == k:
+                break
+            x = x.left if key < k else x.right
         return x
 
     def min(self, x=None):
         if x is None:
             x = self.root
-        while x.get_left() != self.nil:
-            x = x.get_left()
+        nil = self.nil
+        while x.left is not nil:
+            x = x.left
         return x
 
     def max(self, x=None):
         if x is None:
             x = self.root
-        while x.get_right() != self.nil:
-            x = x.get_right()
+        nil = self.nil
+        while x.right is not nil:
+            x = x.right
         return x
 
+    def rank(self, key):
+        """
+        Number of keys in the tree less than or equal to key.
+        """
+        return self.count_below(key, True)
+
+    def count_below(self, key, inclusive=False):
+        # Count the keys less than key (or equal to it if inclusive) on one path from the root, adding up the left
+        # subtrees we pass by
+        count = 0
+        x = self.root
+        while x != self.nil:
+            if key < x.get_key() or (not inclusive and key == x.get_key()):
+                x = x.get_left()
+            else:
+                count += x.get_left().get_size() + 1
+                x = x.get_right()
+        return count
+
+    def select(self, k):
+        """
+        Return the node with the k-th smallest key (k starting at 1), or T.nil if there are fewer than k keys.
+        """
+        x = self.root
+        while x != self.nil:
+            r = x.get_left().get_size() + 1
+            if k == r:
+                return x
+            elif k < r:
+                x = x.get_left()
+            else:
+                k -= r
+                x = x.get_right()
+        return x
+
+    def count_range(self, a, b):
+        """
+        Number of keys k in the tree with a <= k <= b.
+        """
+        if b < a:
+            return 0
+        return self.count_below(b, True) - self.count_below(a)
+
+    def range_iter(self, a, b):
+        """
+        Yield the keys k with a <= k <= b in sorted order.
+        """
+        for key in self.iter_from(a):
+            if b < key:
+                break
+            yield key
+
     def insert(self, key):
         self.insert_node(self.create_node(key))
 
@@ -115,70 +396,205 @@ class tree(object):
         """
         Insert a node into the tree.
         """
-        y = self.nil
+        nil = self.nil
+        key = z.key
+        y = nil
         x = self.root
-        while x != self.nil:
+        while x is not nil:
             y = x
-            if z.get_key() < x.get_key():
-                x = x.get_left()
-            else:
-                x = x.get_right()
-        z.set_parent(y)
-        if y == self.nil:
+            # z ends up in the subtree of every node on the way down
+            x.size += 1
+            x = x.left if key < x.key else x.right
+        z.parent = y
+        if y is nil:
             self.root = z
-        elif z.get_key() < y.get_key():
-            y.set_left(z)
+        elif key < y.key:
+            y.left = z
         else:
-            y.set_right(z)
-        z.set_left(self.nil)
-        z.set_right(self.nil)
-        z.set_color(RED)
+            y.right = z
+        z.left = nil
+        z.right = nil
+        z.size = 1
+        z.color = RED
         self.insert_fixup(z)
 
     def insert_fixup(self, z):
         """
         Restore the red-black properties after insert.
         """
-        while z.get_parent().get_color() == RED:
-            if z.get_parent() == z.get_parent().get_parent().get_left():  # parent of z is a left child
-                y = z.get_parent().get_parent().get_right()  # uncle of z
-                if y.get_color() == RED:
+        p = z.parent
+        while p.color == RED:
+            g = p.parent  # grand parent of z
+            if p is g.left:  # parent of z is a left child
+                y = g.right  # uncle of z
+                if y.color == RED:
                     # Case 1: z (left/right child) - red, z.parent - red, z.uncle - red
                     # Solution: Change the color of parent and uncle to black
                     # Parent of z and uncle of z are both red this means you can re-color them to black
                     # to make sure that the black-height didn't change, you have to re-color their parent to
                     # red. Then you have to continue checking.
-                    z.get_parent().set_color(BLACK)
-                    y.set_color(BLACK)
-                    z.get_parent().get_parent().set_color(RED)
-                    z = z.get_parent().get_parent()
+                    p.color = BLACK
+                    y.color = BLACK
+                    g.color = RED
+                    z = g
                 else:
                     # Case 2: z (right child) - red, z.parent - red, z.uncle - black
                     # Solution: Transform case 2 into case 3 by left rotation
-                    if z == z.get_parent().get_right():
-                        z = z.get_parent()
+                    if z is p.right:
+                        z = p
                         self.left_rotate(z)
+                        p = z.parent
                     # Case 3: z (left child) - red, z.parent - red, z.uncle - black
                     # Solution: Change the color of parent to black and grand parent to red followed by a right rotate
                     # on parent
-                    z.get_parent().set_color(BLACK)
-                    z.get_parent().get_parent().set_color(RED)  # set grand parent to red, since z's parent is black
-                    self.right_rotate(z.get_parent().get_parent())
+                    p.color = BLACK
+                    g.color = RED  # set grand parent to red, since z's parent is black
+                    self.right_rotate(g)
             else:  # parent of z is a right child
-                y = z.get_parent().get_parent().get_left()  # uncle of z
-                if y.get_color() == RED:
-                    z.get_parent().set_color(BLACK)
-                    y.set_color(BLACK)
-                    z.get_parent().get_parent().set_color(RED)
-                    z = z.get_parent().get_parent()
+                y = g.left  # uncle of z
+                if y.color == RED:
+                    p.color = BLACK
+                    y.color = BLACK
+                    g.color = RED
+                    z = g
                 else:
-                    if z == z.get_parent().get_left():
-                        z = z.get_parent()
+                    if z is p.left:
+                        z = p
                         self.right_rotate(z)
-                    z.get_parent().set_color(BLACK)
-                    z.get_parent().get_parent().set_color(RED)
-                    self.left_rotate(z.get_parent().get_parent())
-        self.root.set_color(BLACK)
+                        p = z.parent
+                    p.color = BLACK
+                    g.color = RED
+                    self.left_rotate(g)
+            p = z.parent
+        # Re-coloring a red root adds one to the black height of the whole tree, which join needs to know
+        grew = self.root.color == RED
+        self.root.color = BLACK
+        return grew
+
+    def delete(self, key):
+        """
+        Delete one node with the given key. Returns False if the key is not in the tree.
+        """
+        z = self.search(key)
+        if z == self.nil:
+            return False
+        self.delete_node(z)
+        return True
+
+    def transplant(self, u, v):
+        """ Replace the subtree rooted at u with the subtree rooted at v. """
+        p = u.parent
+        if p is self.nil:
+            self.root = v
+        elif u is p.left:
+            p.left = v
+        else:
+            p.right = v
+        if v is not self.nil:
+            v.parent = p
+
+    def delete_node(self, z):
+        """
+        Delete a node from the tree.
+        """
+        nil = self.nil
+        y = z
+        y_original_color = y.color
+        # x moves into the place of the removed node and p becomes its parent. x may be T.nil, whose parent is never
+        # set, so p is tracked separately.
+        if z.left is nil:
+            x = z.right
+            p = z.parent
+            self.transplant(z, x)
+        elif z.right is nil:
+            x = z.left
+            p = z.parent
+            self.transplant(z, x)
+        else:
+            # z has two children: its successor y, which has no left child, takes the place and color of z
+            y = self.min(z.right)
+            y_original_color = y.color
+            x = y.right
+            if y.parent is z:
+                p = y
+            else:
+                p = y.parent
+                self.transplant(y, x)
+                y.right = z.right
+                y.right.parent = y
+            self.transplant(z, y)
+            y.left = z.left
+            y.left.parent = y
+            y.color = z.color
+
+        # One node is gone from every subtree on the path from p up to the root, y included if it moved
+        q = p
+        while q is not nil:
+            q.size = q.left.size + q.right.size + 1
+            q = q.parent
+
+        if y_original_color == BLACK:
+            self.delete_fixup(x, p)
+
+    def delete_fixup(self, x, p):
+        """
+        Restore the red-black properties after delete. p is the parent of x, which may be T.nil.
+        """
+        # x carries an extra black, which is moved up the tree until it lands on a red node or the root, or is
+        # removed by rotations. At most three rotations happen in all.
+        while x is not self.root and x.color == BLACK:
+            if x is p.left:
+                w = p.right  # sibling of x
+                if w.color == RED:
+                    # Case 1: sibling is red. Rotate to get a black sibling.
+                    w.color = BLACK
+                    p.color = RED
+                    self.left_rotate(p)
+                    w = p.right
+                if w.left.color == BLACK and w.right.color == BLACK:
+                    # Case 2: sibling and both its children are black. Re-color the sibling to red and move the extra
+                    # black up to the parent.
+                    w.color = RED
+                    x = p
+                    p = x.parent
+                else:
+                    if w.right.color == BLACK:
+                        # Case 3: the far child of the sibling is black. Transform into case 4 by a right rotation.
+                        w.left.color = BLACK
+                        w.color = RED
+                        self.right_rotate(w)
+                        w = p.right
+                    # Case 4: the far child of the sibling is red. A left rotation on the parent absorbs the extra
+                    # black.
+                    w.color = p.color
+                    p.color = BLACK
+                    w.right.color = BLACK
+                    self.left_rotate(p)
+                    x = self.root
+            else:  # x is a right child
+                w = p.left
+                if w.color == RED:
+                    w.color = BLACK
+                    p.color = RED
+                    self.right_rotate(p)
+                    w = p.left
+                if w.right.color == BLACK and w.left.color == BLACK:
+                    w.color = RED
+                    x = p
+                    p = x.parent
+                else:
+                    if w.left.color == BLACK:
+                        w.right.color = BLACK
+                        w.color = RED
+                        self.left_rotate(w)
+                        w = p.left
+                    w.color = p.color
+                    p.color = BLACK
+                    w.left.color = BLACK
+                    self.right_rotate(p)
+                    x = self.root
+        if x is not self.nil:
+            x.color = BLACK
 
     def left_rotate(self, x):
         """ Left rotate x. """
@@ -189,35 +605,44 @@ class tree(object):
         #   / \               <--------              / \
         #  /   \          Left-Rotate(W,S)          /   \
         # G     U                                  U     Y
-        y = x.get_right()
-        x.set_right(y.get_left())
-        if y.get_left() != self.nil:
-            y.get_left().set_parent(x)
-        y.set_parent(x.get_parent())
-        if x.get_parent() == self.nil:
+        y = x.right
+        b = y.left
+        x.right = b
+        if b is not self.nil:
+            b.parent = x
+        p = x.parent
+        y.parent = p
+        if p is self.nil:
             self.root = y
-        elif x == x.get_parent().get_left():
-            x.get_parent().set_left(y)
+        elif x is p.left:
+            p.left = y
         else:
-            x.get_parent().set_right(y)
-        y.set_left(x)
-        x.set_parent(y)
+            p.right = y
+        y.left = x
+        x.parent = y
+        # y takes over the subtree of x, and x keeps its left child and the old left child of y
+        y.size = x.size
+        x.size = x.left.size + b.size + 1
 
     def right_rotate(self, y):
         #print "inside right rotate for: " + str(y.get_key())
-        x = y.get_left()
-        y.set_left(x.get_right())
-        if x.get_right() != self.nil:
-            x.get_right().set_parent(y)
-        x.set_parent(y.get_parent())
-        if y.get_parent() == self.nil:
+        x = y.left
+        b = x.right
+        y.left = b
+        if b is not self.nil:
+            b.parent = y
+        p = y.parent
+        x.parent = p
+        if p is self.nil:
             self.root = x
-        elif y == y.get_parent().get_right():
-            y.get_parent().set_right(x)
+        elif y is p.right:
+            p.right = x
         else:
-            y.get_parent().set_left(x)
-        x.set_right(y)
-        y.set_parent(x)
+            p.left = x
+        x.right = y
+        y.parent = x
+        x.size = y.size
+        y.size = b.size + y.right.size + 1
 
     def is_valid_rb_node(self, node):
         # Check 1: Node should have two children
@@ -241,6 +666,10 @@ class tree(object):
             if self.nil != node.get_right() and node != node.get_right().get_parent():
                 return 0, False
 
+            # check if the subtree size is the sum of the sizes of the children plus the node itself
+            if node.get_size() != node.get_left().get_size() + node.get_right().get_size() + 1:
+                return 0, False
+
             # Go down each subtree and check if the child nodes are valid
             left_counts, left_ok = self.is_valid_rb_node(node.get_left())
             if not left_ok:
@@ -249,9 +678,11 @@ class tree(object):
             if not right_ok:
                 return 0, False
 
-            # check if the subtrees are balanced
+            # check if the subtrees are balanced, and count the node itself in the black height if it is black
             if left_counts != right_counts:
                 return 0, False
+            if node.get_color() == BLACK:
+                return left_counts + 1, True
             return left_counts, True
         else:
             return 0, True
@@ -261,18 +692,416 @@ class tree(object):
             if node.get_key():
                 if node.get_left():
                     visit_node(node.get_left())
-                    print "[Key: " + str(node.get_key()) + ", color: " + node.get_color() + "] -> Left child: [Key: " + \
-                          str(node.get_left().get_key()) + ", color: " + node.get_left().get_color() + "]"
+                    print "[Key: " + str(node.get_key()) + ", color: " + node_color(node) + "] -> Left child: [Key: " + \
+                          str(node.get_left().get_key()) + ", color: " + node_color(node.get_left()) + "]"
                 if node.get_right():
                     visit_node(node.get_right())
-                    print "[Key: " + str(node.get_key()) + ", color: " + node.get_color() + "] -> Right child: [Key: " + \
-                          str(node.get_right().get_key()) + ", color: " + node.get_right().get_color() + "]"
+                    print "[Key: " + str(node.get_key()) + ", color: " + node_color(node) + "] -> Right child: [Key: " + \
+                          str(node.get_right().get_key()) + ", color: " + node_color(node.get_right()) + "]"
 
         print "Current state of RB tree: Root: [key: " + str(self.root.get_key()) + ", color: " + \
-              self.root.get_color() + "]"
+              node_color(self.root) + "]"
         visit_node(self.root)
 
 
+class map_node(node):
+    __slots__ = ("value",)
+
+    def get_value(self):
+        return self.value
+
+    def set_value(self, newValue):
+        self.value = newValue
+
+    def __init__(self, key, value=None):
+        node.__init__(self, key)
+        self.value = value
+
+
+# This class uses the tree as an ordered map: every key is stored once, along with a value, and each operation finds
+# its node in a single descent from the root. If a key function is given, add(item) stores an item under key(item),
+# which is computed once when the item is added, so the items themselves are never compared.
+class ordered_map(tree):
+    def __init__(self, key=None, createNode=map_node):
+        tree.__init__(self, createNode)
+        self.key_func = key
+
+    def insert(self, key, value=None):
+        self.put(key, value)
+
+    def attach(self, z, y):
+        # Hang the new node z below y, where the descent for its key ended, and rebalance
+        nil = self.nil
+        z.parent = y
+        if y is nil:
+            self.root = z
+        elif z.key < y.key:
+            y.left = z
+        else:
+            y.right = z
+        z.left = nil
+        z.right = nil
+        z.size = 1
+        z.color = RED
+        while y is not nil:
+            y.size += 1
+            y = y.parent
+        self.insert_fixup(z)
+
+    def put(self, key, value):
+        """
+        Map key to value, replacing the value the key had, and return the node holding it.
+        """
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            k = x.key
+            if key == k:
+                x.value = value
+                return x
+            y = x
+            x = x.left if key < k else x.right
+        z = self.create_node(key, value)
+        self.attach(z, y)
+        return z
+
+    def add(self, item):
+        """
+        Store the item under key(item), or under the item itself if there is no key function.
+        """
+        if self.key_func is None:
+            return self.put(item, item)
+        return self.put(self.key_func(item), item)
+
+    def get(self, key, default=None):
+        x = self.search(key)
+        if x is self.nil:
+            return default
+        return x.value
+
+    def setdefault(self, key, default=None):
+        """
+        Return the value of key, mapping it to default first if it is not in the map.
+        """
+        nil = self.nil
+        y = nil
+        x = self.root
+        while x is not nil:
+            k = x.key
+            if key == k:
+                return x.value
+            y = x
+            x = x.left if key < k else x.right
+        self.attach(self.create_node(key, default), y)
+        return default
+
+    def pop(self, key, *default):
+        """
+        Remove key from the map and return its value, or default if given and the key is not in the map.
+        """
+        x = self.search(key)
+        if x is self.nil:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self.delete_node(x)
+        return x.value
+
+    def __getitem__(self, key):
+        x = self.search(key)
+        if x is self.nil:
+            raise KeyError(key)
+        return x.value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __contains__(self, key):
+        return self.search(key) is not self.nil
+
+    def items(self, x=None):
+        """
+        Yield the (key, value) pairs of the subtree rooted at x (the whole map by default) in sorted order.
+        """
+        if x is None:
+            x = self.root
+        nil = self.nil
+        stack = []
+        while stack or x is not nil:
+            if x is not nil:
+                stack.append(x)
+                x = x.left
+            else:
+                x = stack.pop()
+                yield x.key, x.value
+                x = x.right
+
+    def values(self):
+        for key, value in self.items():
+            yield value
+
+
+# Node of a persistent_tree. Nodes are never changed once built, so any number of tree versions can share them. There
+# are no parent pointers (a node can be in many trees) and leaves are None.
+class persistent_node(object):
+    __slots__ = ("key", "left", "right", "color", "size")
+
+    def get_left(self):
+        return self.left
+
+    def get_right(self):
+        return self.right
+
+    def get_color(self):
+        return self.color
+
+    def get_key(self):
+        return self.key
+
+    def get_size(self):
+        return self.size
+
+    def __init__(self, color, left, key, right):
+        self.key = key
+        self.left = left
+        self.right = right
+        self.color = color
+        self.size = (left.size if left is not None else 0) + (right.size if right is not None else 0) + 1
+
+
+def is_red(x):
+    return x is not None and x.color == RED
+
+
+def balance(color, l, key, r):
+    """
+    Build the node (color, l, key, r), fixing a red node with a red child right below a black node.
+    """
+    # Each of the four cases turns the black node and its red descendants into a red node with two black children
+    # (Okasaki, "Red-black trees in a functional setting")
+    if color == BLACK:
+        if is_red(l):
+            if is_red(l.left):
+                return persistent_node(RED, persistent_node(BLACK, l.left.left, l.left.key, l.left.right), l.key,
+                                       persistent_node(BLACK, l.right, key, r))
+            if is_red(l.right):
+                return persistent_node(RED, persistent_node(BLACK, l.left, l.key, l.right.left), l.right.key,
+                                       persistent_node(BLACK, l.right.right, key, r))
+        if is_red(r):
+            if is_red(r.left):
+                return persistent_node(RED, persistent_node(BLACK, l, key, r.left.left), r.left.key,
+                                       persistent_node(BLACK, r.left.right, r.key, r.right))
+            if is_red(r.right):
+                return persistent_node(RED, persistent_node(BLACK, l, key, r.left), r.key,
+                                       persistent_node(BLACK, r.right.left, r.right.key, r.right.right))
+    return persistent_node(color, l, key, r)
+
+
+# This class is an immutable version of a red-black tree. insert leaves the tree unchanged and returns a new version,
+# which shares all nodes with the old one except the O(log n) nodes on the path to the new key. A reader can hold on
+# to any version and read it without locks while a writer keeps inserting, and a version is freed as soon as nothing
+# refers to it any more.
+class persistent_tree(object):
+    def __init__(self, root=None):
+        self.root = root
+
+    def __len__(self):
+        return self.root.size if self.root is not None else 0
+
+    def __iter__(self):
+        stack = []
+        x = self.root
+        while stack or x is not None:
+            if x is not None:
+                stack.append(x)
+                x = x.left
+            else:
+                x = stack.pop()
+                yield x.key
+                x = x.right
+
+    def __contains__(self, key):
+        return self.search(key) is not None
+
+    def search(self, key):
+        """ Return a node with the key, or None. """
+        x = self.root
+        while x is not None:
+            k = x.key
+            if key == k:
+                break
+            x = x.left if key < k else x.right
+        return x
+
+    def min(self):
+        x = self.root
+        while x is not None and x.left is not None:
+            x = x.left
+        return x
+
+    def max(self):
+        x = self.root
+        while x is not None and x.right is not None:
+            x = x.right
+        return x
+
+    def rank(self, key):
+        """ Number of keys in the tree less than or equal to key. """
+        count = 0
+        x = self.root
+        while x is not None:
+            if key < x.key:
+                x = x.left
+            else:
+                count += (x.left.size if x.left is not None else 0) + 1
+                x = x.right
+        return count
+
+    def select(self, k):
+        """ Return the node with the k-th smallest key (k starting at 1), or None. """
+        x = self.root
+        while x is not None:
+            r = (x.left.size if x.left is not None else 0) + 1
+            if k == r:
+                return x
+            elif k < r:
+                x = x.left
+            else:
+                k -= r
+                x = x.right
+        return x
+
+    def insert(self, key):
+        """
+        Return a new version of the tree which also holds the key.
+        """
+        # Walk down to the leaf where the key belongs, then rebuild the path bottom up: every node on it is copied
+        # with the new child and balanced, as in the recursive insert of Okasaki
+        path = []
+        x = self.root
+        while x is not None:
+            path.append(x)
+            x = x.left if key < x.key else x.right
+        x = persistent_node(RED, None, key, None)
+        for y in reversed(path):
+            if key < y.key:
+                x = balance(y.color, x, y.key, y.right)
+            else:
+                x = balance(y.color, y.left, y.key, x)
+        if x.color == RED:
+            x = persistent_node(BLACK, x.left, x.key, x.right)
+        return persistent_tree(x)
+
+    def is_valid(self):
+        """ Check the red-black properties and the subtree sizes. """
+        def black_height(x):
+            # Return the black height of the subtree rooted at x, or -1 if it is not a valid red-black tree
+            if x is None:
+                return 0
+            if x.color == RED and (is_red(x.left) or is_red(x.right)):
+                return -1
+            if x.size != (x.left.size if x.left is not None else 0) + (x.right.size if x.right is not None else 0) + 1:
+                return -1
+            left_height = black_height(x.left)
+            if left_height < 0 or left_height != black_height(x.right):
+                return -1
+            return left_height + 1 if x.color == BLACK else left_height
+
+        return not is_red(self.root) and black_height(self.root) >= 0
+
+
+def nil_node(createNode):
+    nil = NIL_NODES.get(createNode)
+    if nil is None:
+        nil = createNode(None)
+        nil.set_size(0)
+        NIL_NODES[createNode] = nil
+    return nil
+
+
+def join(t1, k, t2):
+    """
+    Return a tree holding the keys of t1, the key k and the keys of t2, where no key of t1 is greater than k and no key
+    of t2 is less than k. Takes O(log n) and leaves t1 and t2 empty.
+    """
+    if t1.nil is not t2.nil:
+        raise ValueError("trees made of different kinds of nodes cannot be joined")
+    if (t1.root != t1.nil and k < t1.max().get_key()) or (t2.root != t2.nil and t2.min().get_key() < k):
+        raise ValueError("keys of the first tree must be <= k <= keys of the second tree")
+    t, h = join_at(t1, t1.create_node(k), t2)
+    return t
+
+
+def join_at(t1, x, t2, h1=None, h2=None):
+    # Join t1 and t2, whose black heights are h1 and h2, with the node x in between and return the joined tree with its
+    # black height. x is hung as a red node in place of the first black node of black height min(h1, h2) on the right
+    # spine of the taller tree (or the left spine if t2 is taller), with the shorter tree as its other child. Only the
+    # nodes on the spine above x are touched.
+    nil = t1.nil
+    if h1 is None:
+        h1 = t1.black_height()
+    if h2 is None:
+        h2 = t2.black_height()
+    if t1.root.get_color() == RED:
+        t1.root.set_color(BLACK)
+        h1 += 1
+    if t2.root.get_color() == RED:
+        t2.root.set_color(BLACK)
+        h2 += 1
+
+    t = t1.empty()
+    parent = nil
+    if h1 >= h2:
+        t.root = t1.root
+        y = t1.root
+        h = h1
+        while not (y.get_color() == BLACK and h == h2):
+            parent = y
+            if y.get_color() == BLACK:
+                h -= 1
+            y = y.get_right()
+        x.set_left(y)
+        x.set_right(t2.root)
+        if parent == nil:
+            t.root = x
+        else:
+            parent.set_right(x)
+    else:
+        t.root = t2.root
+        y = t2.root
+        h = h2
+        while not (y.get_color() == BLACK and h == h1):
+            parent = y
+            if y.get_color() == BLACK:
+                h -= 1
+            y = y.get_left()
+        x.set_left(t1.root)
+        x.set_right(y)
+        if parent == nil:
+            t.root = x
+        else:
+            parent.set_left(x)
+    x.set_parent(parent)
+    if x.get_left() != nil:
+        x.get_left().set_parent(x)
+    if x.get_right() != nil:
+        x.get_right().set_parent(x)
+    x.set_color(RED)
+    x.set_size(x.get_left().get_size() + x.get_right().get_size() + 1)
+    while parent != nil:
+        parent.set_size(parent.get_left().get_size() + parent.get_right().get_size() + 1)
+        parent = parent.get_parent()
+
+    grew = t.insert_fixup(x)
+    t1.root = nil
+    t2.root = nil
+    return t, max(h1, h2) + 1 if grew else max(h1, h2)
+
+
 def generate_tree(t, keys):
     for i, key in enumerate(keys):
         for k in keys[:i]:
@@ -294,7 +1123,44 @@ def node_color(node):
         return "Black"
 
 
+def benchmark(n):
+    # Time n random inserts, lookups and deletes, and report the memory taken by each node
+    keys = range(0, n)
+    random.shuffle(keys)
+    rbtree = tree()
+
+    start_time = time.time()
+    for key in keys:
+        rbtree.insert(key)
+    insert_time = time.time()
+    for key in keys:
+        rbtree.search(key)
+    search_time = time.time()
+    for key in keys[:n // 2]:
+        rbtree.delete(key)
+    delete_time = time.time()
+    sorted_tree = tree.from_sorted(range(0, n))
+    build_time = time.time()
+
+    print "Keys: " + str(n)
+    print "Insert: %.3fs (%.2f us per key)" % (insert_time - start_time, 1e6 * (insert_time - start_time) / n)
+    print "Search: %.3fs (%.2f us per key)" % (search_time - insert_time, 1e6 * (search_time - insert_time) / n)
+    print "Delete half: %.3fs (%.2f us per key)" % (delete_time - search_time,
+                                                    1e6 * (delete_time - search_time) / max(n // 2, 1))
+    print "Build from sorted keys: %.3fs" % (build_time - delete_time)
+    print "Bytes per node: " + str(sys.getsizeof(sorted_tree.root))
+    print "Valid: " + str(rbtree.is_valid_rb_node(rbtree.root)[1] and sorted_tree.is_valid_rb_node(sorted_tree.root)[1])
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Red-black tree")
+    parser.add_argument("--benchmark", type=int, default=None, metavar="N",
+                        help="time N random inserts, lookups and deletes instead of the interactive menu")
+    args = parser.parse_args()
+    if args.benchmark is not None:
+        benchmark(args.benchmark)
+        return
+
     # Initialize and print the RB tree
     keys = [10, 85, 15, 70, 20, 60, 30, 50, 65, 80, 90, 40, 5, 55]
     print "Keys used to initialize the RB tree: ", str(keys)
@@ -312,9 +1178,14 @@ def main():
     print "6 -> Successor"
     print "7 -> Predecessor"
     print "8 -> Print"
-    print "9 -> Exit"
+    print "9 -> Rank"
+    print "10 -> Select"
+    print "11 -> Count range"
+    print "12 -> Range"
+    print "13 -> Delete"
+    print "14 -> Exit"
     ip = input('Enter your choice: ')
-    while ip in range(1, 9):
+    while ip in range(1, 14):
         if ip == 1:
             key = input('Enter the key you want to search for: ')
             keyNode = rbtree.search(int(key))
@@ -346,6 +1217,30 @@ def main():
             print "[key: " + str(keyNode.get_key()) + ", color: ", node_color(keyNode) + "]"
         elif ip == 8:
             rbtree.print_tree()
+        elif ip == 9:
+            key = input('Enter the key whose rank is to be found: ')
+            print "Number of keys less than or equal to " + str(key) + ": " + str(rbtree.rank(key))
+        elif ip == 10:
+            k = input('Enter k to find the k-th smallest key: ')
+            keyNode = rbtree.select(k)
+            if keyNode.get_key() is not None:
+                print "[key: " + str(keyNode.get_key()) + ", color: ", node_color(keyNode) + "]"
+            else:
+                print "The tree has fewer than " + str(k) + " keys"
+        elif ip == 11:
+            a = input('Enter the lower bound: ')
+            b = input('Enter the upper bound: ')
+            print "Number of keys within the range: " + str(rbtree.count_range(a, b))
+        elif ip == 12:
+            a = input('Enter the lower bound: ')
+            b = input('Enter the upper bound: ')
+            print "Keys within the range: ", list(rbtree.range_iter(a, b))
+        elif ip == 13:
+            key = input('Enter the key you want to delete: ')
+            if rbtree.delete(key):
+                print "The key has been deleted from the RB tree"
+            else:
+                print "The key was not found in the tree"
         else:
             break
         ip = input('Enter your choice: ')
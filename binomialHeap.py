@@ -37,6 +37,8 @@
 # degree -> -1 >> Height of the node
 # sibling -> None >> Points to the adjacent sibling on the right of this element
 # child -> None >> Stores a pointer to the left-most child of this node
+# item -> None >> Payload stored along with the key, e.g. the vertex whose distance is the key
+# handle -> None >> The Handle of the key stored at this node, which moves along with the key
 class Node:
     def get_parent(self):
         return self.parent
@@ -68,6 +70,29 @@ class Node:
     def set_child(self, child):
         self.child = child
 
+    def get_item(self):
+        return self.item
+
+    def set_item(self, item):
+        self.item = item
+
+    def get_handle(self):
+        return self.handle
+
+    def set_handle(self, handle):
+        self.handle = handle
+
+    def swap_items(self, other):
+        # Exchange the key, payload and handle of this node with those of the other node, pointing the handles at
+        # their new nodes. The nodes themselves stay in place.
+        self.key, other.key = other.key, self.key
+        self.item, other.item = other.item, self.item
+        self.handle, other.handle = other.handle, self.handle
+        if self.handle is not None:
+            self.handle.set_node(self)
+        if other.handle is not None:
+            other.handle.set_node(other)
+
     def get_minimum(self):
         y = self
         x = self
@@ -140,12 +165,39 @@ class Node:
                     break
         return node
 
-    def __init__(self, key):
+    def __init__(self, key, item=None):
         self.key = key
         self.parent = None
         self.degree = 0
         self.sibling = None
         self.child = None
+        self.item = item
+        self.handle = None
+
+
+# CLASS: Handle
+# DESCRIPTION: This class stores a stable reference to a key inserted into a binomial heap. Keys move between nodes when
+# they are bubbled up, so callers keep the handle instead of the node, and the heap keeps the handle pointed at the
+# node which currently stores the key. The handle is cleared once its key leaves the heap.
+# ---------------------------------------------------------
+# [Element Name] -> [Initialization value] >> [Description]
+# ---------------------------------------------------------
+# node -> node >> The Node currently storing the key, None once the key was removed from the heap
+class Handle:
+    def get_node(self):
+        return self.node
+
+    def set_node(self, node):
+        self.node = node
+
+    def get_key(self):
+        return self.node.get_key()
+
+    def get_item(self):
+        return self.node.get_item()
+
+    def __init__(self, node):
+        self.node = node
 
 
 # CLASS: BinomialHeap
@@ -155,6 +207,7 @@ class Node:
 class BinomialHeap(object):
     def __init__(self):
         self.head_node = None  # Initialize with head element which is None
+        self.min_node = None  # The root storing the minimum key, kept up to date by every operation
 
     # FUNCTION SIGNATURE: get_head()
     # DESCRIPTION: This function fetches the head of this binomial heap and returns it to the caller
@@ -167,23 +220,13 @@ class BinomialHeap(object):
         self.head_node = newHead
 
     # FUNCTION SIGNATURE: binomial_heap_minimum()
-    # DESCRIPTION: Since a binomial heap is min-heap-ordered, the minimum key must reside in a root node. This
-    # procedure checks all roots, which number at most [lg n] + 1, saving the current minimum in minNodeKey and a
-    # pointer to the current minimum in minNode.
+    # DESCRIPTION: Since a binomial heap is min-heap-ordered, the minimum key must reside in a root node. Every
+    # operation which changes the roots or their keys keeps a pointer to the root with the minimum key, so this takes
+    # O(1).
     # ARGUMENTS: -NA-
-    # RETURNS: A Node object which stores the minimum value within the binomial heap
+    # RETURNS: A Node object which stores the minimum value within the binomial heap, None if the heap is empty
     def binomial_heap_minimum(self):
-        minNode = self.get_head()
-        minNodeKey = 9999
-        if minNode is not None:
-            currNode = minNode.get_sibling()
-            while currNode is not None:
-                nodeKey = currNode.get_key()
-                if nodeKey < minNodeKey:
-                    minNode = currNode
-                    minNodeKey = nodeKey
-                currNode = currNode.get_sibling()
-        return minNode
+        return self.min_node
 
     # FUNCTION SIGNATURE: binomial_link(Node, Node)
     # DESCRIPTION: This function makes the Node y parent of Node z
@@ -204,37 +247,24 @@ class BinomialHeap(object):
     #  node2 - A Node object which is to be merged with this heap
     # RETURNS: The new head Node for the merged binomial heaps
     def binomial_heap_merge(self, node2):
+        # Both root lists are sorted by degree, so they are merged like two sorted lists, taking the root of smaller
+        # degree from either list at each step
         node1 = self.get_head()
-        while node1 is not None and node2 is not None:
-            if node1.get_degree() == node2.get_degree():
-                tempNode = node2
+        head = None
+        tail = None
+        while node1 is not None or node2 is not None:
+            if node2 is None or (node1 is not None and node1.get_degree() <= node2.get_degree()):
+                nextNode = node1
+                node1 = node1.get_sibling()
+            else:
+                nextNode = node2
                 node2 = node2.get_sibling()
-                tempNode.set_sibling(node1.get_sibling())
-                node1.set_sibling(tempNode)
-                node1 = tempNode.get_sibling()
+            if tail is None:
+                head = nextNode
             else:
-                if node1.get_degree() < node2.get_degree():
-                    if node1.get_sibling() is None or node1.get_sibling().get_degree() > node2.get_degree():
-                        tempNode = node2
-                        node2 = node2.get_sibling()
-                        tempNode.set_sibling(node1.get_sibling())
-                        node1.set_sibling(tempNode)
-                        node1 = tempNode.get_sibling()
-                    else:
-                        node1 = node1.get_sibling()
-                else:
-                    tempNode = node1
-                    node1 = node2
-                    node2 = node2.get_sibling()
-                    node1.set_sibling(tempNode)
-                    if tempNode == self.get_head():
-                        self.set_head(node1)
-
-        if node1 is None:
-            node1 = self.get_head()
-            while node1.get_sibling() is not None:
-                node1 = node1.get_sibling()
-            node1.set_sibling(node2)
+                tail.set_sibling(nextNode)
+            tail = nextNode
+        self.set_head(head)
 
     # FUNCTION SIGNATURE: binomial_heap_union(Node)
     # DESCRIPTION: The following functions unites the node passed in as arguments and returns the resulting heap
@@ -243,13 +273,20 @@ class BinomialHeap(object):
     # RETURNS: A BinomialHeap object which is a union of the two objects passed in as arguments
     def binomial_heap_union(self, node2):
         self.binomial_heap_merge(node2)
+        if self.get_head() is None:
+            self.min_node = None
+            return
 
+        # A root which is passed over is never linked again, so the minimum is found among these roots on the way
         prevTemp = None
+        minNode = None
         temp = self.get_head()
         nextTemp = self.get_head().get_sibling()
 
         while nextTemp is not None:
             if (temp.get_degree() != nextTemp.get_degree()) or (nextTemp.get_sibling() is not None and nextTemp.get_sibling().get_degree() == temp.get_degree()):
+                if minNode is None or temp.get_key() < minNode.get_key():
+                    minNode = temp
                 prevTemp = temp
                 temp = nextTemp
             else:
@@ -271,15 +308,31 @@ class BinomialHeap(object):
                     temp = nextTemp
             nextTemp = temp.get_sibling()
 
+        if minNode is None or temp.get_key() < minNode.get_key():
+            minNode = temp
+        self.min_node = minNode
+
     # FUNCTION SIGNATURE: binomial_heap_extract_min()
-    # DESCRIPTION: This function finds the minimum value from the binomial heap and removes the its Node from the heap
+    # DESCRIPTION: This function removes the root storing the minimum value from the binomial heap
     # ARGUMENTS: -NA-
-    # RETURNS: A Node object which stores the minimum value in the Heap
+    # RETURNS: The minimum value in the Heap, None if the heap is empty
     def binomial_heap_extract_min(self):
+        minNode = self.min_node
+        if minNode is None:
+            return None
+        self.binomial_heap_remove_root(minNode)
+        return minNode.get_key()
+
+    # FUNCTION SIGNATURE: binomial_heap_remove_root(Node)
+    # DESCRIPTION: This function removes a root from the root list and merges its children, which form a binomial
+    #              heap of their own, back into this heap. The handle of the removed key is cleared.
+    # ARGUMENTS:
+    #  root - The Node object to be removed, which must be in the root list
+    # RETURNS: -NA-
+    def binomial_heap_remove_root(self, root):
         temp = self.get_head()
         prevTemp = None
-        minNode = self.get_head().get_minimum()
-        while temp.get_key() != minNode.get_key():
+        while temp is not root:
             prevTemp = temp
             temp = temp.get_sibling()
 
@@ -294,58 +347,91 @@ class BinomialHeap(object):
             temp.set_parent(None)
             temp = temp.get_sibling()
 
-        if not(self.get_head() is None and fakeNode is None):
-            if self.get_head() is None and fakeNode is not None:
-                self.set_head(fakeNode.reverse(None))
-            else:
-                if not(Node is not None and fakeNode is None):
-                    self.binomial_heap_union(fakeNode.reverse(None))
+        # The union finds the new minimum. Without children to merge, the roots only have to be searched again if the
+        # minimum was removed.
+        if fakeNode is not None:
+            self.binomial_heap_union(fakeNode.reverse(None))
+        elif root is self.min_node:
+            self.min_node = self.get_head().get_minimum() if self.get_head() is not None else None
 
-        return minNode.get_key()
+        root.set_child(None)
+        root.set_sibling(None)
+        root.set_degree(0)
+        if root.get_handle() is not None:
+            root.get_handle().set_node(None)
 
     # FUNCTION SIGNATURE: binomial_heap_insert(Node)
     # DESCRIPTION: The following function inserts a new node into the binomial heap by creating a one node binomial
     # heap and merging it with this instance of binomial heap
     # ARGUMENTS:
     #  x - A Node object which needs to be inserted into the binomial heap
-    # RETURNS: True iff the procedure is completed successfully
+    # RETURNS: A Handle object which refers to the inserted key for as long as it stays in the heap
     def binomial_heap_insert(self, x):
+        x.set_handle(Handle(x))
         if self.get_head() is None:
             self.set_head(x)
-            return self
+            self.min_node = x
         else:
-            return self.binomial_heap_union(x)
+            self.binomial_heap_union(x)
+        return x.get_handle()
 
-    # FUNCTION SIGNATURE: binomial_heap_extract_min()
-    # DESCRIPTION: This function decreases the node x in this instance of binomial heap to a new value k
+    # FUNCTION SIGNATURE: binomial_heap_find_handle(Handle or key)
+    # DESCRIPTION: This function returns the Node storing the key referred to by a handle, or for callers which only
+    #              know the key, walks the whole heap to find a Node storing it
     # ARGUMENTS:
-    #  x - The Node whose value is to be updated
-    #  k - new value for the node
-    # RETURNS: true iff the value is updated, false iff the value of k is greater than the current key in Node x
-    def binomial_heap_decrease_key(self, val, k):
-        temp = self.get_head().get_node(val)
-        if temp is None:
+    #  x - A Handle object returned by binomial_heap_insert, or a key
+    # RETURNS: The Node object storing the key, or None if it is not in the heap
+    def binomial_heap_find_handle(self, x):
+        if isinstance(x, Handle):
+            return x.get_node()
+        if self.get_head() is None:
+            return None
+        return self.get_head().get_node(x)
+
+    # FUNCTION SIGNATURE: binomial_heap_bubble_up(Node, bool)
+    # DESCRIPTION: This function moves the key stored in x up its tree while it is smaller than the key of the parent,
+    #              or all the way up to the root if force is set. Keys are moved together with their payloads and
+    #              handles, so every handle still refers to its own key afterwards.
+    # ARGUMENTS:
+    #  x - The Node object whose key is moved up
+    #  force - True to move the key up to the root regardless of the keys above it
+    # RETURNS: The Node object where the key ends up
+    def binomial_heap_bubble_up(self, x, force=False):
+        parent = x.get_parent()
+        while parent is not None and (force or x.get_key() < parent.get_key()):
+            x.swap_items(parent)
+            x = parent
+            parent = x.get_parent()
+        return x
+
+    # FUNCTION SIGNATURE: binomial_heap_decrease_key(Handle or key, key)
+    # DESCRIPTION: This function decreases the key referred to by x in this instance of binomial heap to a new value k.
+    #              Given a handle, this takes O(log n).
+    # ARGUMENTS:
+    #  x - The Handle of the key to be updated (or the key itself, which is looked up in O(n))
+    #  k - new value for the key
+    # RETURNS: true iff the value is updated, false iff the key is not in the heap or k is greater than the current key
+    def binomial_heap_decrease_key(self, x, k):
+        temp = self.binomial_heap_find_handle(x)
+        if temp is None or temp.get_key() < k:
             return False
         temp.set_key(k)
-        tempParent = temp.get_parent()
-
-        while tempParent is not None and temp.get_key() < temp.get_parent().get_key():
-            z = temp.get_key()
-            temp.set_key(tempParent.get_key())
-            tempParent.set_key(z)
-
-            temp = tempParent
-            tempParent = tempParent.get_parent()
+        temp = self.binomial_heap_bubble_up(temp)
+        if temp.get_parent() is None and temp.get_key() < self.min_node.get_key():
+            self.min_node = temp
+        return True
 
-    # FUNCTION SIGNATURE: binomial_heap_delete(Node)
-    # DESCRIPTION: This function deletes a Node object from this instance os the binomial heap by decreasing the key
-    #              stored in x to -9999 and then extracting this Node from the heap
+    # FUNCTION SIGNATURE: binomial_heap_delete(Handle or key)
+    # DESCRIPTION: This function deletes a key from this instance of the binomial heap by moving it up to the root of
+    #              its tree and removing that root. Given a handle, this takes O(log n).
     # ARGUMENTS:
-    #  x - The Node object to be deleted from the heap
-    # RETURNS: True iff the Node is deleted from the heap
+    #  x - The Handle of the key to be deleted (or the key itself, which is looked up in O(n))
+    # RETURNS: True iff the key is deleted from the heap
     def binomial_heap_delete(self, x):
-        self.binomial_heap_decrease_key(x, -9999)
-        self.binomial_heap_extract_min()
+        temp = self.binomial_heap_find_handle(x)
+        if temp is None:
+            return False
+        self.binomial_heap_remove_root(self.binomial_heap_bubble_up(temp, True))
         return True
 
     # FUNCTION SIGNATURE: binomial_heap_walk()
@@ -1,3 +1,12 @@
+import argparse
+import copy
+import mmap
+import multiprocessing
+import time
+from array import array
+from collections import deque
+
+
 class Edge:
     def get_flow(self):
         return self.flow
@@ -23,11 +32,19 @@ class Edge:
     def set_end_vertex(self, vertex):
         self.end_vertex = vertex
 
-    def __init__(self, flow, capacity, u, v):
+    def get_reverse(self):
+        return self.reverse
+
+    def set_reverse(self, index):
+        self.reverse = index
+
+    def __init__(self, flow, capacity, u, v, reverse=-1):
         self.flow = flow
         self.capacity = capacity
         self.start_vertex = u
         self.end_vertex = v
+        # Index of the paired residual edge (v -> u) within Graph.edges
+        self.reverse = reverse
 
 
 class Vertex:
@@ -48,130 +65,971 @@ class Vertex:
         self.excess_flow = excess_flow
 
 
+class FIFOScheduler:
+    # Hands out the active (overflowing) vertices in the order in which they became active
+
+    def __init__(self, n):
+        self.queue = deque()
+        self.queued = [False] * n
+
+    def is_empty(self):
+        return len(self.queue) == 0
+
+    def add(self, vertex, height):
+        if not self.queued[vertex]:
+            self.queued[vertex] = True
+            self.queue.append(vertex)
+
+    def pop(self):
+        vertex = self.queue.popleft()
+        self.queued[vertex] = False
+        return vertex
+
+
+class HighestLabelScheduler:
+    # Hands out the active vertex with the largest height first. buckets[h] holds the active vertices that had
+    # height h when they were added and 'highest' never drops below the largest non-empty bucket
+
+    def __init__(self, n):
+        self.buckets = [[] for i in range(0, 2 * n + 1)]
+        self.queued = [False] * n
+        self.highest = 0
+        self.size = 0
+
+    def is_empty(self):
+        return self.size == 0
+
+    def add(self, vertex, height):
+        if self.queued[vertex]:
+            return
+        while height >= len(self.buckets):
+            self.buckets.append([])
+        self.queued[vertex] = True
+        self.buckets[height].append(vertex)
+        self.size += 1
+        if height > self.highest:
+            self.highest = height
+
+    def pop(self):
+        while not self.buckets[self.highest]:
+            self.highest -= 1
+        vertex = self.buckets[self.highest].pop()
+        self.queued[vertex] = False
+        self.size -= 1
+        return vertex
+
+
+# Strategies available to Graph.get_max_flow for picking the next active vertex
+SCHEDULERS = {
+    "fifo": FIFOScheduler,
+    "highest_label": HighestLabelScheduler,
+}
+
+
 class Graph:
     def __init__(self, n):
         self.vertices_count = n
         self.vertices = []
         self.edges = []
+        # adjacency[u] stores the indices (within self.edges) of all the residual edges leaving u
+        self.adjacency = []
+        # current_edge[u] is the position within adjacency[u] from where the next discharge of u resumes
+        self.current_edge = [0] * n
+        # height_vertices[h] lists the vertices at height h, kept up to date while the gap heuristic is on to detect
+        # gaps and find the vertices above them
+        self.height_vertices = []
+        # Numbers (in the order of addition) of the edges created by add_super_terminals
+        self.terminal_edges = []
+        # Super source and super sink added for each (sources, sinks) pair, so that solving again reuses them
+        self.super_terminals = {}
+        self.init_solver_state()
 
         # Initialize the vertices with 0 height and 0 excess flow
         for i in range(0, n):
             self.vertices.append(Vertex(0, 0))
+            self.adjacency.append([])
 
     def add_edge(self, start, end, capacity):
-        self.edges.append(Edge(0, capacity, start, end))
+        # Each edge is stored along with its reverse edge in the residual graph. The reverse edge starts with
+        # 0 capacity and both edges remember the index of their pair, so that either one can be reached in O(1)
+        index = len(self.edges)
+        self.edges.append(Edge(0, capacity, start, end, index + 1))
+        self.edges.append(Edge(0, 0, end, start, index))
+        self.adjacency[start].append(index)
+        self.adjacency[end].append(index + 1)
+
+    def add_edges(self, starts, ends, capacities):
+        # Add the edges starts[k] -> ends[k] with capacities[k], for every k
+        if not len(starts) == len(ends) == len(capacities):
+            raise ValueError("starts, ends and capacities should have the same length")
+        for k in range(0, len(starts)):
+            self.add_edge(starts[k], ends[k], capacities[k])
+
+    def add_vertex(self):
+        # Add an isolated vertex and return its index
+        self.vertices.append(Vertex(0, 0))
+        self.adjacency.append([])
+        self.current_edge.append(0)
+        self.vertices_count += 1
+        return self.vertices_count - 1
+
+    def get_edge_capacities(self):
+        # Capacities of the added edges, in the order in which they were added
+        return [self.edges[i].get_capacity() for i in range(0, len(self.edges), 2)]
+
+    def set_added_edge_capacity(self, k, capacity):
+        self.edges[2 * k].set_capacity(capacity)
+
+    def get_added_edge_index(self, k):
+        # Index of the k-th added edge within the residual edges
+        return 2 * k
+
+    def add_super_terminals(self, sources, sinks):
+        # Connect a new super source to every vertex in 'sources' and every vertex in 'sinks' to a new super sink, so
+        # that a problem with several sources and sinks can be solved as a single source, single sink one. Return the
+        # two new vertices, or the ones added before for the same sources and sinks.
+        key = (tuple(sources), tuple(sinks))
+        if key in self.super_terminals:
+            return self.super_terminals[key]
+        super_source = self.add_vertex()
+        super_sink = self.add_vertex()
+        k = len(self.get_edge_capacities())
+        for vertex in sources:
+            self.terminal_edges.append(k)
+            self.add_edge(super_source, vertex, 0)
+            k += 1
+        for vertex in sinks:
+            self.terminal_edges.append(k)
+            self.add_edge(vertex, super_sink, 0)
+            k += 1
+        self.resize_terminal_edges()
+        self.super_terminals[key] = (super_source, super_sink)
+        return super_source, super_sink
+
+    def resize_terminal_edges(self):
+        # The edges of the super terminals get the total capacity of all the other edges, which no flow can exceed
+        capacities = self.get_edge_capacities()
+        total = sum(capacities) - sum(capacities[k] for k in self.terminal_edges)
+        for k in self.terminal_edges:
+            self.set_added_edge_capacity(k, total)
+
+    def reset(self, capacities=None):
+        # Drop the flow and heights left by the last solve so that the graph can be solved again from scratch.
+        # 'capacities' optionally replaces the capacities of the first len(capacities) added edges.
+        if capacities is not None:
+            if len(capacities) > len(self.edges) // 2:
+                raise ValueError("Got " + str(len(capacities)) + " capacities for " + str(len(self.edges) // 2) + " edges")
+            for k in range(0, len(capacities)):
+                self.set_added_edge_capacity(k, capacities[k])
+            self.resize_terminal_edges()
+        for edge in self.edges:
+            edge.set_flow(0)
+        for vertex in self.vertices:
+            vertex.set_height(0)
+            vertex.set_excess_flow(0)
+        self.current_edge = [0] * self.vertices_count
+        self.init_solver_state()
+
+    def get_height(self, vertex_i):
+        return self.vertices[vertex_i].get_height()
+
+    def get_excess_flow(self, vertex_i):
+        return self.vertices[vertex_i].get_excess_flow()
+
+    def edge_indices(self, vertex_i):
+        # Indices of the residual edges leaving this vertex
+        return self.adjacency[vertex_i]
+
+    def get_edge_end(self, index):
+        return self.edges[index].get_end_vertex()
+
+    def get_edge_flow(self, index):
+        return self.edges[index].get_flow()
+
+    def get_edge_capacity(self, index):
+        return self.edges[index].get_capacity()
+
+    def set_edge_capacity(self, index, capacity):
+        self.edges[index].set_capacity(capacity)
+
+    def find_edge(self, start, end):
+        # Index of the first edge added from start to end. Edges added through add_edge sit at even indices and
+        # their reverse edges right after them.
+        for i in self.adjacency[start]:
+            if i % 2 == 0 and self.edges[i].get_end_vertex() == end:
+                return i
+        raise ValueError("There is no edge from " + str(start) + " to " + str(end))
+
+    def move_flow(self, index, amount):
+        # Send 'amount' more flow through the edge (a negative amount takes flow back) and update the excess flow of
+        # both of its end points
+        edge = self.edges[index]
+        edge.set_flow(edge.get_flow() + amount)
+        self.update_reverse_edge_flow(index, amount)
+        self.vertices[edge.get_start_vertex()].set_excess_flow(self.vertices[edge.get_start_vertex()].get_excess_flow() - amount)
+        self.vertices[edge.get_end_vertex()].set_excess_flow(self.vertices[edge.get_end_vertex()].get_excess_flow() + amount)
+
+    def init_solver_state(self):
+        # Settings of the last call to get_max_flow, reused by resolve() after capacity updates
+        self.source = None
+        self.sink = None
+        self.strategy = "fifo"
+        self.global_relabel_frequency = None
+        self.use_gap = False
+        self.relabels_since_global = 0
+        self.stats = {}
 
     def pre_flow(self, source_vertex_index):
         # Set the height of source vertex to number of vertices
         self.vertices[source_vertex_index].set_height(len(self.vertices))
 
         # Initialize the values for all edges starting from the source
-        for i in range(0, len(self.edges)):
-            if self.edges[i].get_start_vertex() == source_vertex_index:
-                # Set the flow of the source vertex to capacity of this edge
-                self.edges[i].set_flow(self.edges[i].get_capacity())
-
-                # Initializing the excess flow for edges emanating from the source
-                self.vertices[self.edges[i].get_end_vertex()].set_excess_flow(self.vertices[self.edges[i].get_end_vertex()].get_excess_flow() + self.edges[i].get_flow())
-
-                # Add an edge between the destination and the source of this edge to the residual
-                # graph with capacity 0
-                self.edges.append(
-                    Edge(
-                        -self.edges[i].get_flow(), # reversing the flow through this edge
-                        0, # capacity is initialized to 0
-                        self.edges[i].get_end_vertex(), # setting the source for this new edge
-                        source_vertex_index # setting the destination of this new edge
-                    )
-                )
-
-    def overflow_vertex(self):
-        # Check if any of the vertices have their excess flow > 0 and return its index
-        for i in range(1, len(self.vertices) - 1):
-            if self.vertices[i].get_excess_flow() > 0:
-                return i
+        for i in self.adjacency[source_vertex_index]:
+            residual = self.edges[i].get_capacity() - self.edges[i].get_flow()
+            if residual <= 0:
+                continue
 
-        return -1
+            # Saturate this edge by setting its flow to its capacity
+            self.edges[i].set_flow(self.edges[i].get_flow() + residual)
 
-    def update_reverse_edge_flow(self, index, new_flow):
-        # Find the end points of the reverse edge
-        start_vertex_index = self.edges[index].get_end_vertex()
-        end_vertex_index = self.edges[index].get_start_vertex()
-
-        # Search for the reverse edge using the above vertices and update the flow for this
-        # edge by reducing the flow of this edge by the value of 'new_flow'
-
-        # Check if the reverse edge already exists
-        for i in range(0, len(self.edges)):
-            if self.edges[i].get_end_vertex() == end_vertex_index and self.edges[i].get_start_vertex() == start_vertex_index:
-                self.edges[i].set_flow(self.edges[i].get_flow() - new_flow)
-                return
-
-        # Since the reverse edge doesn't exists, add it to the residual graph
-        self.edges.append(Edge(0, new_flow, start_vertex_index, end_vertex_index))
-
-    def push_flow(self, vertex_i):
-        # We need to push the overflow on this vertex to an outgoing edge which has the capacity
-        for i in range(0, len(self.edges)):
-            if self.edges[i].get_start_vertex() == vertex_i:
-                # Check if flow = capacity since in such a case we cannot push the overflow into
-                # this edge
-                if self.edges[i].get_flow() == self.edges[i].get_capacity():
-                    continue
+            # Initializing the excess flow for edges emanating from the source
+            self.vertices[self.edges[i].get_end_vertex()].set_excess_flow(self.vertices[self.edges[i].get_end_vertex()].get_excess_flow() + residual)
+
+            # Reverse the flow through the paired edge so that it can be pushed back to the source
+            self.update_reverse_edge_flow(i, residual)
 
-                # We can push the overflow into this edge if the height of its end vertex < height
-                # of the source vertex
-                if self.vertices[vertex_i].get_height() > self.vertices[self.edges[i].get_end_vertex()].get_height():
-                    # The new flow will be equal to the minimum of remaining flow on edge and excess flow
-                    new_flow = 0
-                    if self.edges[i].get_capacity() - self.edges[i].get_flow() < self.vertices[vertex_i].get_excess_flow():
-                        new_flow = self.edges[i].get_capacity() - self.edges[i].get_flow()
-                    else:
-                        new_flow = self.vertices[vertex_i].get_excess_flow()
+    def update_reverse_edge_flow(self, index, new_flow):
+        # The reverse edge was created along with this edge, so reduce its flow by the value of 'new_flow'
+        reverse_edge = self.edges[self.edges[index].get_reverse()]
+        reverse_edge.set_flow(reverse_edge.get_flow() - new_flow)
 
-                    # Reduce the excess flow for overflowing vertex
-                    self.vertices[vertex_i].set_excess_flow(self.vertices[vertex_i].get_excess_flow() - new_flow)
+    def push_edge(self, vertex_i, index):
+        # The new flow will be equal to the minimum of remaining flow on edge and excess flow
+        edge = self.edges[index]
+        new_flow = edge.get_capacity() - edge.get_flow()
+        if self.vertices[vertex_i].get_excess_flow() < new_flow:
+            new_flow = self.vertices[vertex_i].get_excess_flow()
 
-                    # Increase the excess flow for the adjacent vertex
-                    self.vertices[self.edges[i].get_end_vertex()].set_excess_flow(self.vertices[self.edges[i].get_end_vertex()].get_excess_flow() + new_flow)
+        # Reduce the excess flow for overflowing vertex
+        self.vertices[vertex_i].set_excess_flow(self.vertices[vertex_i].get_excess_flow() - new_flow)
 
-                    # Adding residual flow
-                    self.edges[i].set_flow(self.edges[i].get_flow() + new_flow)
+        # Increase the excess flow for the adjacent vertex
+        self.vertices[edge.get_end_vertex()].set_excess_flow(self.vertices[edge.get_end_vertex()].get_excess_flow() + new_flow)
 
-                    self.update_reverse_edge_flow(i, new_flow)
+        # Adding residual flow
+        edge.set_flow(edge.get_flow() + new_flow)
 
-                    return True
-        return False
+        self.update_reverse_edge_flow(index, new_flow)
+        return new_flow
 
     def relabel(self, vertex_i):
-        max_height = 9999 # Random large number to intialize the minimum height of an adjacent vertex
+        min_height = None
 
         # Find the adjacent vertex with minimum height
-        for i in range(0, len(self.edges)):
-            if self.edges[i].get_start_vertex() == vertex_i:
-                # Do not relabel if the flow is equal to the capacity
-                if self.edges[i].get_flow() == self.edges[i].get_capacity():
-                    continue
+        for i in self.adjacency[vertex_i]:
+            # Do not relabel if the flow is equal to the capacity
+            if self.edges[i].get_flow() == self.edges[i].get_capacity():
+                continue
+
+            # Update the minimum height
+            height = self.vertices[self.edges[i].get_end_vertex()].get_height()
+            if min_height is None or height < min_height:
+                min_height = height
+
+        if min_height is None:
+            return False
+        self.vertices[vertex_i].set_height(min_height + 1)
+        return True
+
+    def discharge(self, vertex_i, scheduler, source, sink):
+        # Keep pushing the excess of this vertex through admissible edges (height drops by exactly one) until it is
+        # gone. Once every edge has been tried the vertex is relabeled and the scan starts over.
+        vertex = self.vertices[vertex_i]
+        adjacency = self.adjacency[vertex_i]
+        while vertex.get_excess_flow() > 0:
+            if self.current_edge[vertex_i] == len(adjacency):
+                old_height = vertex.get_height()
+                if not self.relabel(vertex_i):
+                    return
+                self.stats["relabels"] += 1
+                self.relabels_since_global += 1
+                self.current_edge[vertex_i] = 0
+                if self.use_gap:
+                    self.move_height(vertex_i, old_height, vertex.get_height())
+                    if not self.height_vertices[old_height] and old_height < self.vertices_count:
+                        self.gap_relabel(old_height)
+                continue
+
+            i = adjacency[self.current_edge[vertex_i]]
+            edge = self.edges[i]
+            end_vertex = self.vertices[edge.get_end_vertex()]
+            if edge.get_flow() < edge.get_capacity() and vertex.get_height() == end_vertex.get_height() + 1:
+                was_active = end_vertex.get_excess_flow() > 0
+                self.push_edge(vertex_i, i)
+                self.stats["pushes"] += 1
+                if not was_active and edge.get_end_vertex() != source and edge.get_end_vertex() != sink:
+                    scheduler.add(edge.get_end_vertex(), end_vertex.get_height())
+            else:
+                self.current_edge[vertex_i] += 1
+
+    def init_height_vertices(self):
+        # Sort every vertex into the list of its height. height_slot[v] is the position of v within its list, so it
+        # can be taken out in O(1), and max_height bounds the heights below the number of vertices which are in use.
+        self.height_vertices = [[] for h in range(0, 2 * self.vertices_count + 1)]
+        self.height_slot = [0] * self.vertices_count
+        self.max_height = 0
+        for i in range(0, self.vertices_count):
+            self.add_height(i, self.get_height(i))
+
+    def add_height(self, vertex_i, height):
+        while height >= len(self.height_vertices):
+            self.height_vertices.append([])
+        vertices = self.height_vertices[height]
+        self.height_slot[vertex_i] = len(vertices)
+        vertices.append(vertex_i)
+        if self.max_height < height < self.vertices_count:
+            self.max_height = height
+
+    def move_height(self, vertex_i, old_height, height):
+        # Move a relabeled vertex to the list of its new height. The last vertex of its old list takes its slot.
+        vertices = self.height_vertices[old_height]
+        last = vertices.pop()
+        if last != vertex_i:
+            slot = self.height_slot[vertex_i]
+            vertices[slot] = last
+            self.height_slot[last] = slot
+        self.add_height(vertex_i, height)
+
+    def gap_relabel(self, gap):
+        # No vertex is left at height 'gap', so none of the vertices above it can reach the sink any more. Lift all
+        # of them above the source at once instead of relabeling them one step at a time. Only the lists of the
+        # heights between the gap and max_height are visited.
+        new_height = self.vertices_count + 1
+        self.stats["gaps"] += 1
+        for height in range(gap + 1, self.max_height + 1):
+            for i in self.height_vertices[height]:
+                self.stats["gap_lifts"] += new_height - height
+                self.lift_vertex(i, new_height)
+                self.add_height(i, new_height)
+            self.height_vertices[height] = []
+        self.max_height = max(gap - 1, 0)
+
+    def lift_vertex(self, vertex_i, height):
+        # Set the height of a vertex lifted by gap_relabel and restart the scan of its edges
+        self.vertices[vertex_i].set_height(height)
+        self.current_edge[vertex_i] = 0
+
+    def global_relabel(self, source, sink):
+        # Set every height to its exact distance to the sink in the residual graph using a reverse BFS. Vertices
+        # which cannot reach the sink get the number of vertices plus their distance to the source, and vertices
+        # which reach neither end up at 2n.
+        n = self.vertices_count
+        heights = [None] * n
+        heights[source] = n
+        for root in (sink, source):
+            heights[root] = 0 if root == sink else n
+            queue = deque([root])
+            while queue:
+                w = queue.popleft()
+                for i in self.adjacency[w]:
+                    # The edge i goes w -> u, so its pair is the residual edge u -> w
+                    u = self.edges[i].get_end_vertex()
+                    reverse_edge = self.edges[self.edges[i].get_reverse()]
+                    if heights[u] is None and reverse_edge.get_flow() < reverse_edge.get_capacity():
+                        heights[u] = heights[w] + 1
+                        queue.append(u)
+
+        for i in range(0, n):
+            if heights[i] is None:
+                heights[i] = 2 * n
+            if heights[i] > self.vertices[i].get_height():
+                self.stats["global_relabel_lifts"] += heights[i] - self.vertices[i].get_height()
+            self.vertices[i].set_height(heights[i])
+            self.current_edge[i] = 0
+        self.init_height_vertices()
 
-                # Update the minimum height
-                if self.vertices[self.edges[i].get_end_vertex()].get_height() < max_height:
-                    max_height = self.vertices[self.edges[i].get_end_vertex()].get_height()
-                    self.vertices[vertex_i].set_height(max_height + 1)
+        self.stats["global_relabels"] += 1
+        self.relabels_since_global = 0
+
+    def active_vertices(self, strategy, source, sink):
+        # Build a scheduler for 'strategy' holding every vertex (other than the source and sink) in overflow
+        scheduler = SCHEDULERS[strategy](self.vertices_count)
+        for i in range(0, self.vertices_count):
+            if i != source and i != sink and self.get_excess_flow(i) > 0:
+                scheduler.add(i, self.get_height(i))
+        return scheduler
+
+    def get_stats(self):
+        # Counters collected during the last call to get_max_flow:
+        # pushes, relabels - number of push and relabel operations
+        # global_relabels, global_relabel_lifts - number of global relabel passes and the total height they added
+        # gaps, gap_lifts - number of gaps found and the total height added by lifting the vertices above them
+        return dict(self.stats)
+
+    def get_max_flow(self, source, sink, strategy="fifo", global_relabel_frequency=None, gap=False):
+        # 'strategy' picks the order in which active vertices are discharged: "fifo" gives the O(V^3) bound and
+        # "highest_label" the O(V^2 * sqrt(E)) bound.
+        # 'global_relabel_frequency' runs a global relabel once at the start and then after every k relabels, and
+        # 'gap' turns on the gap heuristic. Both are off by default.
+        # 'source' and 'sink' can also be lists of vertices, in which case a super source and a super sink are added
+        # to the graph for them (see add_super_terminals). Such a problem is always solved from scratch: the flow
+        # left by an earlier solve is dropped first.
+        if strategy not in SCHEDULERS:
+            raise ValueError("Unknown strategy '" + str(strategy) + "', expected one of: " + ", ".join(sorted(SCHEDULERS)))
+        if global_relabel_frequency is not None and global_relabel_frequency < 1:
+            raise ValueError("global_relabel_frequency should be a positive number of relabels")
+        if isinstance(source, (list, tuple)) or isinstance(sink, (list, tuple)):
+            # Several sources or sinks: solve between a pair of super terminals added for them
+            sources = source if isinstance(source, (list, tuple)) else [source]
+            sinks = sink if isinstance(sink, (list, tuple)) else [sink]
+            source, sink = self.add_super_terminals(sources, sinks)
+            if self.source is not None:
+                self.reset()
+
+        self.source = source
+        self.sink = sink
+        self.strategy = strategy
+        self.global_relabel_frequency = global_relabel_frequency
+        self.use_gap = gap
+        self.reset_stats()
 
-    def get_max_flow(self, source, sink):
         self.pre_flow(source)
+        self.init_height_vertices()
+        if global_relabel_frequency is not None:
+            self.global_relabel(source, sink)
+
+        return self.converge()
+
+    def reset_stats(self):
+        self.stats = dict.fromkeys(["pushes", "relabels", "global_relabels", "global_relabel_lifts", "gaps",
+                                    "gap_lifts"], 0)
+        self.relabels_since_global = 0
+
+    def converge(self):
+        # Discharge the overflowing vertices until none are left and return the flow that reached the sink
+        source = self.source
+        sink = self.sink
+        scheduler = self.active_vertices(self.strategy, source, sink)
 
         # Repeat the operation until none of the vertices are in overflow
-        while self.overflow_vertex() != -1:
-            vertex_i = self.overflow_vertex()
-            if not self.push_flow(vertex_i):
-                self.relabel(vertex_i)
+        while not scheduler.is_empty():
+            self.discharge(scheduler.pop(), scheduler, source, sink)
 
-        # Return the excess flow of the last vertex since this will be the max flow
-        return self.vertices[-1].get_excess_flow()
+            if self.global_relabel_frequency is not None and self.relabels_since_global >= self.global_relabel_frequency:
+                # The heights the scheduler was filled with are stale now, so refill it from scratch
+                self.global_relabel(source, sink)
+                scheduler = self.active_vertices(self.strategy, source, sink)
 
+        # The excess flow collected at the sink is the max flow
+        return self.get_excess_flow(sink)
 
-def main():
+    def min_cut(self):
+        # Return the source side of a minimum cut for the flow found by the last solve: the vertices which can still
+        # be reached from the source in the residual graph
+        if self.source is None:
+            raise ValueError("get_max_flow has to be called before the minimum cut can be found")
+        reached = [False] * self.vertices_count
+        reached[self.source] = True
+        queue = deque([self.source])
+        while queue:
+            u = queue.popleft()
+            for i in self.edge_indices(u):
+                v = self.get_edge_end(i)
+                if not reached[v] and self.get_edge_flow(i) < self.get_edge_capacity(i):
+                    reached[v] = True
+                    queue.append(v)
+        return [u for u in range(0, self.vertices_count) if reached[u]]
+
+    def update_capacity(self, start, end, capacity, resolve=True):
+        # Change the capacity of the edge start -> end after a solve and repair the current flow so that it can be
+        # re-solved from where it is instead of from scratch. Unless 'resolve' is False the new max flow is returned
+        # right away; several updates can be applied with resolve=False followed by a single call to resolve().
+        if self.source is None:
+            raise ValueError("get_max_flow has to be called before capacities can be updated")
+        if capacity < 0:
+            raise ValueError("Capacity should not be negative")
+        index = self.find_edge(start, end)
+        self.set_edge_capacity(index, capacity)
+        self.limit_flow(index)
+
+        # The edges of super terminals are sized after the total capacity of the other edges, which just changed
+        terminal_indices = [self.get_added_edge_index(k) for k in self.terminal_edges]
+        if terminal_indices and index not in terminal_indices:
+            self.resize_terminal_edges()
+            for i in terminal_indices:
+                self.limit_flow(i)
+
+        if resolve:
+            return self.resolve()
+
+    def limit_flow(self, index):
+        # Take the flow above the capacity of the edge back. The start of the edge keeps it as excess, while its end is
+        # left with a deficit which has to be taken off the edges leaving it.
+        overflow = self.get_edge_flow(index) - self.get_edge_capacity(index)
+        if overflow > 0:
+            self.move_flow(index, -overflow)
+            self.cancel_deficit(self.get_edge_end(index))
+
+    def cancel_deficit(self, vertex_i):
+        # A vertex with negative excess sends out more flow than it receives. Take the missing amount back from the
+        # edges leaving it, which moves the deficit further along until it reaches a vertex with enough excess, the
+        # source or the sink.
+        stack = [vertex_i]
+        while stack:
+            u = stack.pop()
+            if u == self.source or u == self.sink:
+                continue
+            for i in self.edge_indices(u):
+                if self.get_excess_flow(u) >= 0:
+                    break
+                if self.get_edge_flow(i) <= 0:
+                    continue
+                amount = min(self.get_edge_flow(i), -self.get_excess_flow(u))
+                self.move_flow(i, -amount)
+                if self.get_excess_flow(self.get_edge_end(i)) < 0:
+                    stack.append(self.get_edge_end(i))
+
+    def resolve(self):
+        # Re-converge after update_capacity(..., resolve=False) calls, starting from the current flow. The edges
+        # leaving the source are saturated again and the heights are rebuilt with a global relabel, since the changed
+        # edges might break the height invariant.
+        if self.source is None:
+            raise ValueError("get_max_flow has to be called before the flow can be re-solved")
+        self.reset_stats()
+        self.pre_flow(self.source)
+        self.global_relabel(self.source, self.sink)
+        return self.converge()
+
+
+class CompactGraph(Graph):
+    # Array backed version of Graph for large networks. Edges are collected in parallel arrays and laid out in
+    # compressed sparse row (CSR) order the first time the solver needs them: the residual edges leaving u occupy
+    # the positions first_edge[u] ... first_edge[u + 1] - 1 of the head, capacity, flow and reverse arrays. Heights
+    # and excess flows are arrays as well, so no object is created per edge or vertex. Edge indices taken or
+    # returned by the methods below are positions in the CSR arrays.
+
+    def __init__(self, n, capacity_typecode="l"):
+        self.vertices_count = n
+        self.capacity_typecode = capacity_typecode
+
+        # Edges in the order in which they were added
+        self.edge_start = array("i")
+        self.edge_end = array("i")
+        self.edge_capacity = array(capacity_typecode)
+
+        # CSR layout of the residual graph, filled in by build()
+        self.built = False
+        self.first_edge = array("i", [0]) * (n + 1)
+        self.head = array("i")
+        self.capacity = array(capacity_typecode)
+        self.flow = array(capacity_typecode)
+        self.reverse = array("i")
+        # edge_index[k] is the position of the k-th added edge within the CSR arrays and edge_of maps a position back
+        # to k, or to -1 for the reverse edges
+        self.edge_index = array("i")
+        self.edge_of = array("i")
+
+        self.height = array("i", [0]) * n
+        self.excess_flow = array(capacity_typecode, [0]) * n
+        self.current_edge = array("i", [0]) * n
+        self.height_vertices = []
+        self.terminal_edges = []
+        # Super source and super sink added for each (sources, sinks) pair, so that solving again reuses them
+        self.super_terminals = {}
+        self.init_solver_state()
+
+    def add_edge(self, start, end, capacity):
+        self.edge_start.append(start)
+        self.edge_end.append(end)
+        self.edge_capacity.append(capacity)
+        self.built = False
+
+    def add_edges(self, starts, ends, capacities):
+        # Bulk version of add_edge. The arguments can be any sequences (lists, arrays, ...) of the same length
+        if not len(starts) == len(ends) == len(capacities):
+            raise ValueError("starts, ends and capacities should have the same length")
+        self.edge_start.extend(array("i", starts))
+        self.edge_end.extend(array("i", ends))
+        self.edge_capacity.extend(array(self.capacity_typecode, capacities))
+        self.built = False
+
+    def add_vertex(self):
+        self.height.append(0)
+        self.excess_flow.append(0)
+        self.current_edge.append(0)
+        self.first_edge.append(self.first_edge[-1])
+        self.vertices_count += 1
+        self.built = False
+        return self.vertices_count - 1
+
+    def get_edge_capacities(self):
+        return self.edge_capacity
+
+    def set_added_edge_capacity(self, k, capacity):
+        self.edge_capacity[k] = capacity
+        if k < len(self.edge_index):
+            self.capacity[self.edge_index[k]] = capacity
+
+    def get_added_edge_index(self, k):
+        if not self.built:
+            self.build()
+        return self.edge_index[k]
+
+    def reset(self, capacities=None):
+        if capacities is not None:
+            if len(capacities) > len(self.edge_capacity):
+                raise ValueError("Got " + str(len(capacities)) + " capacities for " + str(len(self.edge_capacity)) + " edges")
+            for k in range(0, len(capacities)):
+                self.set_added_edge_capacity(k, capacities[k])
+            self.resize_terminal_edges()
+        self.flow = array(self.capacity_typecode, [0]) * len(self.flow)
+        self.height = array("i", [0]) * self.vertices_count
+        self.excess_flow = array(self.capacity_typecode, [0]) * self.vertices_count
+        self.current_edge = self.first_edge[:self.vertices_count]
+        self.init_solver_state()
+
+    def build(self):
+        # Lay out the residual graph in CSR order with a counting sort of the edges by their start vertex. Every edge
+        # gets a reverse edge with 0 capacity and the two store each other's position. Flows of the edges that were
+        # already laid out by an earlier build are carried over.
+        n = self.vertices_count
+        m = len(self.edge_start)
+        start = self.edge_start
+        end = self.edge_end
+
+        first_edge = array("i", [0]) * (n + 1)
+        for k in range(0, m):
+            first_edge[start[k] + 1] += 1
+            first_edge[end[k] + 1] += 1
+        for u in range(0, n):
+            first_edge[u + 1] += first_edge[u]
+
+        position = first_edge[:n]
+        head = array("i", [0]) * (2 * m)
+        capacity = array(self.capacity_typecode, [0]) * (2 * m)
+        flow = array(self.capacity_typecode, [0]) * (2 * m)
+        reverse = array("i", [0]) * (2 * m)
+        edge_index = array("i", [0]) * m
+        edge_of = array("i", [-1]) * (2 * m)
+        for k in range(0, m):
+            u = start[k]
+            v = end[k]
+            i = position[u]
+            position[u] += 1
+            j = position[v]
+            position[v] += 1
+            head[i] = v
+            head[j] = u
+            capacity[i] = self.edge_capacity[k]
+            reverse[i] = j
+            reverse[j] = i
+            edge_index[k] = i
+            edge_of[i] = k
+            if k < len(self.edge_index):
+                flow[i] = self.flow[self.edge_index[k]]
+                flow[j] = -flow[i]
+
+        self.first_edge = first_edge
+        self.head = head
+        self.capacity = capacity
+        self.flow = flow
+        self.reverse = reverse
+        self.edge_index = edge_index
+        self.edge_of = edge_of
+        self.current_edge = first_edge[:n]
+        self.built = True
+
+    def get_height(self, vertex_i):
+        return self.height[vertex_i]
+
+    def get_excess_flow(self, vertex_i):
+        return self.excess_flow[vertex_i]
+
+    def edge_indices(self, vertex_i):
+        return range(self.first_edge[vertex_i], self.first_edge[vertex_i + 1])
+
+    def get_edge_end(self, index):
+        return self.head[index]
+
+    def get_edge_flow(self, index):
+        return self.flow[index]
+
+    def get_edge_capacity(self, index):
+        return self.capacity[index]
+
+    def set_edge_capacity(self, index, capacity):
+        self.capacity[index] = capacity
+        self.edge_capacity[self.edge_of[index]] = capacity
+
+    def find_edge(self, start, end):
+        if not self.built:
+            self.build()
+        for i in range(self.first_edge[start], self.first_edge[start + 1]):
+            if self.head[i] == end and self.edge_of[i] >= 0:
+                return i
+        raise ValueError("There is no edge from " + str(start) + " to " + str(end))
+
+    def move_flow(self, index, amount):
+        self.flow[index] += amount
+        self.flow[self.reverse[index]] -= amount
+        self.excess_flow[self.head[self.reverse[index]]] -= amount
+        self.excess_flow[self.head[index]] += amount
+
+    def pre_flow(self, source_vertex_index):
+        if not self.built:
+            self.build()
+        self.height[source_vertex_index] = self.vertices_count
+
+        # Saturate all the edges starting from the source
+        for i in range(self.first_edge[source_vertex_index], self.first_edge[source_vertex_index + 1]):
+            residual = self.capacity[i] - self.flow[i]
+            if residual > 0:
+                self.flow[i] += residual
+                self.flow[self.reverse[i]] -= residual
+                self.excess_flow[self.head[i]] += residual
+
+    def push_edge(self, vertex_i, index):
+        new_flow = self.capacity[index] - self.flow[index]
+        if self.excess_flow[vertex_i] < new_flow:
+            new_flow = self.excess_flow[vertex_i]
+        self.excess_flow[vertex_i] -= new_flow
+        self.excess_flow[self.head[index]] += new_flow
+        self.flow[index] += new_flow
+        self.flow[self.reverse[index]] -= new_flow
+        return new_flow
+
+    def relabel(self, vertex_i):
+        min_height = None
+        for i in range(self.first_edge[vertex_i], self.first_edge[vertex_i + 1]):
+            if self.flow[i] < self.capacity[i] and (min_height is None or self.height[self.head[i]] < min_height):
+                min_height = self.height[self.head[i]]
+        if min_height is None:
+            return False
+        self.height[vertex_i] = min_height + 1
+        return True
+
+    def discharge(self, vertex_i, scheduler, source, sink):
+        # Same as Graph.discharge, with the arrays pulled into locals for the inner loop
+        head = self.head
+        capacity = self.capacity
+        flow = self.flow
+        reverse = self.reverse
+        height = self.height
+        excess_flow = self.excess_flow
+
+        first = self.first_edge[vertex_i]
+        last = self.first_edge[vertex_i + 1]
+        i = self.current_edge[vertex_i]
+        excess = excess_flow[vertex_i]
+        pushes = 0
+        while excess > 0:
+            if i == last:
+                old_height = height[vertex_i]
+                excess_flow[vertex_i] = excess
+                if not self.relabel(vertex_i):
+                    break
+                self.stats["relabels"] += 1
+                self.relabels_since_global += 1
+                if self.use_gap:
+                    self.move_height(vertex_i, old_height, height[vertex_i])
+                    if not self.height_vertices[old_height] and old_height < self.vertices_count:
+                        self.gap_relabel(old_height)
+                i = first
+                continue
+
+            w = head[i]
+            residual = capacity[i] - flow[i]
+            if residual > 0 and height[vertex_i] == height[w] + 1:
+                if excess < residual:
+                    residual = excess
+                flow[i] += residual
+                flow[reverse[i]] -= residual
+                excess -= residual
+                if excess_flow[w] <= 0 and w != source and w != sink:
+                    scheduler.add(w, height[w])
+                excess_flow[w] += residual
+                pushes += 1
+            else:
+                i += 1
+
+        excess_flow[vertex_i] = excess
+        self.current_edge[vertex_i] = i
+        self.stats["pushes"] += pushes
+
+    def lift_vertex(self, vertex_i, height):
+        self.height[vertex_i] = height
+        self.current_edge[vertex_i] = self.first_edge[vertex_i]
+
+    def global_relabel(self, source, sink):
+        n = self.vertices_count
+        unreached = 2 * n
+        heights = array("i", [unreached]) * n
+        heights[source] = n
+        for root in (sink, source):
+            heights[root] = 0 if root == sink else n
+            queue = deque([root])
+            while queue:
+                w = queue.popleft()
+                for i in range(self.first_edge[w], self.first_edge[w + 1]):
+                    # The edge i goes w -> u, so its pair is the residual edge u -> w
+                    u = self.head[i]
+                    j = self.reverse[i]
+                    if heights[u] == unreached and self.flow[j] < self.capacity[j]:
+                        heights[u] = heights[w] + 1
+                        queue.append(u)
+
+        for i in range(0, n):
+            if heights[i] > self.height[i]:
+                self.stats["global_relabel_lifts"] += heights[i] - self.height[i]
+            self.current_edge[i] = self.first_edge[i]
+        self.height = heights
+        self.init_height_vertices()
+
+        self.stats["global_relabels"] += 1
+        self.relabels_since_global = 0
+
+
+# State of a solve_capacities worker process, set up once by init_capacity_worker
+batch_graph = None
+batch_source = None
+batch_sink = None
+batch_options = {}
+
+
+def solve_problem(problem):
+    graph, source, sink, options = problem
+    return graph.get_max_flow(source, sink, **options)
+
+
+def solve_many(problems, processes=None, **options):
+    # Solve a list of independent (graph, source, sink) problems on a pool of worker processes and return their max
+    # flows in the same order. The keyword options are passed on to get_max_flow. The graphs are solved on copies
+    # inside the workers, except with processes=1 where everything runs in this process and the graphs are solved in
+    # place.
+    tasks = [(graph, source, sink, options) for graph, source, sink in problems]
+    if processes == 1:
+        return [solve_problem(task) for task in tasks]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(solve_problem, tasks, pool_chunk_size(len(tasks), processes))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def init_capacity_worker(graph, source, sink, options):
+    global batch_graph, batch_source, batch_sink, batch_options
+
+    batch_graph = graph
+    batch_options = options
+    if isinstance(source, (list, tuple)) or isinstance(sink, (list, tuple)):
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        sinks = sink if isinstance(sink, (list, tuple)) else [sink]
+        source, sink = graph.add_super_terminals(sources, sinks)
+    batch_source = source
+    batch_sink = sink
+
+
+def solve_capacity_vector(capacities):
+    batch_graph.reset(capacities)
+    return batch_graph.get_max_flow(batch_source, batch_sink, **batch_options)
+
+
+def solve_capacities(graph, capacity_vectors, source, sink, processes=None, **options):
+    # Solve one network for many capacity vectors, each holding the capacities of the added edges in the order in
+    # which they were added, and return the max flows in the same order. The graph is sent to each worker only once
+    # and every vector is solved on that worker's copy after a reset. 'source' and 'sink' can be lists of vertices.
+    if processes == 1:
+        init_capacity_worker(copy.deepcopy(graph), source, sink, options)
+        return [solve_capacity_vector(capacities) for capacities in capacity_vectors]
+
+    pool = multiprocessing.Pool(processes, init_capacity_worker, (graph, source, sink, options))
+    try:
+        return pool.map(solve_capacity_vector, capacity_vectors, pool_chunk_size(len(capacity_vectors), processes))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def pool_chunk_size(tasks_count, processes):
+    # Hand the tasks out in a few chunks per worker, which keeps the pickling overhead of small problems low
+    return max(1, tasks_count // (4 * (processes or multiprocessing.cpu_count())))
+
+
+def dimacs_chunks(path, use_mmap=False, chunk_size=1 << 22):
+    # Yield the contents of the file in blocks of roughly chunk_size bytes which always end at a line boundary.
+    # With use_mmap the blocks are sliced from a memory mapped copy of the file instead of being read into a buffer.
+    with open(path, "rb") as input_file:
+        if use_mmap:
+            data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                position = 0
+                while position < len(data):
+                    end = data.find("\n", min(position + chunk_size, len(data)) - 1)
+                    end = len(data) if end == -1 else end + 1
+                    yield data[position:end]
+                    position = end
+            finally:
+                data.close()
+        else:
+            leftover = ""
+            while True:
+                block = input_file.read(chunk_size)
+                if not block:
+                    break
+                end = block.rfind("\n") + 1
+                if end == 0:
+                    leftover += block
+                    continue
+                yield leftover + block[:end]
+                leftover = block[end:]
+            if leftover:
+                yield leftover
+
+
+def load_dimacs(path, graph_class=CompactGraph, use_mmap=False, chunk_size=1 << 22):
+    # Build a graph from a DIMACS max-flow file and return it together with its source and sink. The file is read
+    # a block at a time: blocks made of arc lines only (the bulk of any large instance) are split in one go and
+    # handed to add_edges as whole columns, and only the other blocks are parsed line by line. DIMACS numbers the
+    # vertices from 1, the graph from 0.
+    graph = None
+    source = None
+    sink = None
+    for chunk in dimacs_chunks(path, use_mmap, chunk_size):
+        if graph is not None and chunk[0] == "a" and "\nc" not in chunk and "\np" not in chunk and "\nn" not in chunk:
+            tokens = chunk.split()
+            if len(tokens) % 4 == 0 and tokens.count("a") * 4 == len(tokens):
+                graph.add_edges([int(x) - 1 for x in tokens[1::4]], [int(x) - 1 for x in tokens[2::4]],
+                                [int(x) for x in tokens[3::4]])
+                continue
+
+        for line in chunk.splitlines():
+            fields = line.split()
+            if not fields or fields[0] == "c":
+                continue
+            if fields[0] == "p":
+                if len(fields) != 4 or fields[1] != "max":
+                    raise ValueError("Expected a 'p max <vertices> <arcs>' line, got: " + line)
+                graph = graph_class(int(fields[2]))
+            elif graph is None:
+                raise ValueError("The 'p' line should come before any vertex or arc line")
+            elif fields[0] == "n":
+                if fields[2] == "s":
+                    source = int(fields[1]) - 1
+                elif fields[2] == "t":
+                    sink = int(fields[1]) - 1
+            elif fields[0] == "a":
+                graph.add_edge(int(fields[1]) - 1, int(fields[2]) - 1, int(fields[3]))
+            else:
+                raise ValueError("Unknown DIMACS line: " + line)
+
+    if graph is None or source is None or sink is None:
+        raise ValueError(path + " should have a 'p max' line and both a source and a sink")
+    return graph, source, sink
+
+
+def example():
     graph = Graph(6)
 
     graph.add_edge(0, 1, 16)
@@ -190,6 +1048,51 @@ def main():
 
     print "Maximum Flow: " + str(graph.get_max_flow(source, sink))
 
+    # Solving again with lists of terminals reuses the super source and sink and gives the same flow
+    vertices_count = graph.vertices_count
+    max_flow = graph.get_max_flow([source], [sink])
+    assert graph.get_max_flow([source], [sink]) == max_flow
+    assert graph.vertices_count == vertices_count + 2
+
+    # Capacity updates after such a solve also resize the edges of the super terminals
+    for graph_class in (Graph, CompactGraph):
+        graph = graph_class(2)
+        graph.add_edge(0, 1, 5)
+        assert graph.get_max_flow([0], [1]) == 5
+        assert graph.update_capacity(0, 1, 100) == 100
+        assert graph.update_capacity(0, 1, 3) == 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maximum flow with the push-relabel algorithm")
+    parser.add_argument("file", nargs="?", help="DIMACS max-flow file to solve, the built-in example is used if omitted")
+    parser.add_argument("--strategy", choices=sorted(SCHEDULERS), default="fifo")
+    parser.add_argument("--global-relabel", type=int, default=None, metavar="K",
+                        help="run a global relabel after every K relabels")
+    parser.add_argument("--gap", action="store_true", help="use the gap heuristic")
+    parser.add_argument("--mmap", action="store_true", help="memory map the input file instead of reading it")
+    parser.add_argument("--objects", action="store_true", help="use Graph instead of the array backed CompactGraph")
+    args = parser.parse_args()
+
+    if args.file is None:
+        example()
+        return
+
+    start_time = time.time()
+    graph, source, sink = load_dimacs(args.file, Graph if args.objects else CompactGraph, args.mmap)
+    load_time = time.time()
+    if isinstance(graph, CompactGraph):
+        graph.build()
+    build_time = time.time()
+    max_flow = graph.get_max_flow(source, sink, args.strategy, args.global_relabel, args.gap)
+    solve_time = time.time()
+
+    print "Load: %.3fs" % (load_time - start_time)
+    print "Build: %.3fs" % (build_time - load_time)
+    print "Solve: %.3fs" % (solve_time - build_time)
+    print "Stats: " + str(graph.get_stats())
+    print "Maximum Flow: " + str(max_flow)
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
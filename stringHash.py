@@ -1,8 +1,53 @@
+import mmap
+import multiprocessing
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, insort
+
 # ---------------------------------------------------------------
 # GLOBAL VARIABLES
 # ---------------------------------------------------------------
 
-hashTable = []
+# Prime table sizes, each roughly double the previous one
+PRIMES = [53, 97, 193, 389, 769, 1543, 3079, 6151, 12289, 24593, 49157, 98317, 196613, 393241, 786433, 1572869,
+          3145739, 6291469, 12582917, 25165843, 50331653, 100663319, 201326611, 402653189, 805306457, 1610612741]
+
+# Average number of words per bucket above which a WordIndex moves to a bigger table
+MAX_LOAD_FACTOR = 1.0
+
+# Average number of words per bucket below which a WordIndex moves to a smaller table
+MIN_LOAD_FACTOR = 0.25
+
+# Number of buckets moved to the new table by each insert or delete while a WordIndex is being resized
+REHASH_STEP = 4
+
+# Fraction of occupied slots above which an OpenWordIndex doubles its table
+MAX_OPEN_LOAD_FACTOR = 0.75
+
+# Fraction of occupied slots below which an OpenWordIndex halves its table
+MIN_OPEN_LOAD_FACTOR = 0.2
+
+# Largest number of words in a block of a PrefixIndex before it is split in two
+PREFIX_BLOCK_SIZE = 1024
+
+# Number of bytes read from the input file at a time when indexing it
+CHUNK_SIZE = 1 << 20
+
+# Characters stripped from both ends of a word before it is indexed
+PUNCTUATION = ".!()?"
+
+# Layout of an index snapshot file (see saveSnapshot)
+SNAPSHOT_MAGIC = "WIDX"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sIIQ")
+SNAPSHOT_OFFSETS = struct.Struct("<QQ")
+SNAPSHOT_ENTRY = struct.Struct("<IIIQQ")
+
+# Normalized form and hash value of recently seen tokens, emptied whenever it grows to TOKEN_CACHE_SIZE entries
+tokenCache = {}
+TOKEN_CACHE_SIZE = 1 << 16
 
 # ---------------------------------------------------------------
 # CLASSES
@@ -10,8 +55,12 @@ hashTable = []
 
 
 # This class stores the structure of each node within the linked list. Each node has the following properties:
-# val - the value stored at the node
+# key - the word stored at the node
+# val - the number of times the word occurs
 # nxt - the node that follows the current node in the linked list
+# prev - the node that precedes the current node in the linked list
+# posList - the positions at which the word occurs
+# hashVal - the hash value of the word, kept so that the node can be moved to a new table without rehashing the word
 class node:
 
     def get_key(self):
@@ -44,12 +93,173 @@ class node:
     def add_pos(self, newPos):
         self.posList.append(newPos)
 
-    def __init__(self, key, val, nxt, prev, posList):
+    def add_positions(self, newPositions):
+        self.posList.extend(newPositions)
+
+    def get_hash(self):
+        return self.hashVal
+
+    def __init__(self, key, val, nxt, prev, posList, hashVal=None):
         self.key = key
         self.val = val
         self.nxt = nxt
         self.prev = prev
         self.posList = posList
+        self.hashVal = hashVal
+
+
+# This class stores a sorted list of positions in compressed form. Each position is stored as the difference from the
+# previous one, written as a varint: 7 bits per byte, with the high bit set on every byte but the last. Positions of
+# a frequent word are close to each other, so most of them take a single byte instead of a separate int object, and
+# they are only decoded while the list is iterated. It can be used in place of a list for the positions of an index
+# with WordIndex(postings=PostingList).
+class PostingList(object):
+    __slots__ = ("data", "count", "last")
+
+    def __init__(self, positions=()):
+        self.data = bytearray()
+        self.count = 0
+        self.last = 0
+        self.extend(positions)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        pos = 0
+        delta = 0
+        shift = 0
+        for byte in self.data:
+            if byte & 0x80:
+                delta |= (byte & 0x7F) << shift
+                shift += 7
+            else:
+                pos += delta | (byte << shift)
+                yield pos
+                delta = 0
+                shift = 0
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getstate__(self):
+        return self.data, self.count, self.last
+
+    def __setstate__(self, state):
+        self.data, self.count, self.last = state
+
+    def append(self, pos):
+        delta = pos - self.last
+        if delta < 0:
+            raise ValueError("Positions should be added in increasing order, got " + str(pos) + " after " + str(self.last))
+        while delta >= 0x80:
+            self.data.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        self.data.append(delta)
+        self.last = pos
+        self.count += 1
+
+    def extend(self, positions):
+        if isinstance(positions, PostingList):
+            self.extendShifted(positions, 0)
+            return
+        for pos in positions:
+            self.append(pos)
+
+    def extendShifted(self, other, offset):
+        # Append the positions of another PostingList moved forward by offset. Only its first position is decoded, the
+        # deltas between the others stay the same and are copied as they are.
+        if other.count == 0:
+            return
+        first = 0
+        shift = 0
+        i = 0
+        while other.data[i] & 0x80:
+            first |= (other.data[i] & 0x7F) << shift
+            shift += 7
+            i += 1
+        first |= other.data[i] << shift
+        self.append(first + offset)
+        self.data.extend(other.data[i + 1:])
+        self.count += other.count - 1
+        self.last = other.last + offset
+
+    def intersect(self, other, offset=0):
+        return intersectPositions(self, other, offset)
+
+    def encoded(self):
+        return self.data
+
+    def setEncoded(self, data, count, last):
+        # Take over positions which were already encoded, e.g. read back from a snapshot
+        self.data = bytearray(data)
+        self.count = count
+        self.last = last
+
+
+# This class keeps the distinct words of an index in sorted order to answer prefix queries with a binary search. The
+# words are split into sorted blocks of at most PREFIX_BLOCK_SIZE words, along with the last word of every block, so an
+# insert or delete binary searches for its block and only shifts the words within it rather than the whole list.
+class PrefixIndex:
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        half = PREFIX_BLOCK_SIZE // 2
+        self.blocks = [keys[i:i + half] for i in range(0, len(keys), half)]
+        self.maxes = [block[-1] for block in self.blocks]
+
+    def findBlock(self, key):
+        # Index of the first block whose last word is not smaller than the key
+        return bisect_left(self.maxes, key)
+
+    def add(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+        b = min(self.findBlock(key), len(self.blocks) - 1)
+        block = self.blocks[b]
+        insort(block, key)
+        self.maxes[b] = block[-1]
+        # Split a full block in two halves
+        if len(block) > PREFIX_BLOCK_SIZE:
+            half = len(block) // 2
+            self.blocks.insert(b + 1, block[half:])
+            self.maxes.insert(b + 1, block[-1])
+            del block[half:]
+            self.maxes[b] = block[-1]
+
+    def discard(self, key):
+        b = self.findBlock(key)
+        if b == len(self.blocks):
+            return
+        block = self.blocks[b]
+        i = bisect_left(block, key)
+        if i < len(block) and block[i] == key:
+            del block[i]
+            if block:
+                self.maxes[b] = block[-1]
+            else:
+                del self.blocks[b]
+                del self.maxes[b]
+
+    def lookup(self, prefix, limit=None):
+        # Return the words starting with the prefix in sorted order, at most 'limit' of them
+        result = []
+        b = self.findBlock(prefix)
+        if b == len(self.blocks):
+            return result
+        i = bisect_left(self.blocks[b], prefix)
+        while b < len(self.blocks):
+            block = self.blocks[b]
+            while i < len(block):
+                if not block[i].startswith(prefix) or (limit is not None and len(result) >= limit):
+                    return result
+                result.append(block[i])
+                i += 1
+            b += 1
+            i = 0
+        return result
 
 # ---------------------------------------------------------------
 # HELPER FUNCTIONS
@@ -68,143 +278,760 @@ def findPow(length):
 
 def getTableLength(length):
     power = findPow(length)
-    primes = [53,53,53,53,53,53,97,193,389,769,1543,3079,6151,12289,24593,49157,98317,196613,393241,786433,1572869,
-              3145739,6291469,12582917,25165843,50331653,100663319,201326611,402653189,805306457,1610612741]
-    if power > 31:
-        return primes[30]
-    return primes[power - 1]
+    if power - 6 >= len(PRIMES):
+        return PRIMES[-1]
+    return PRIMES[max(power - 6, 0)]
 
 
-def generateHashVal(word):
-    hashVal = 0
-    word = word.strip('.').strip('!').strip('(').strip(')').strip('?').lower()
-    for i in range(0, len(word)):
-        hashVal = 33*hashVal + ord(word[i])
+def intersectPositions(first, second, offset=0):
+    # Return the positions p of the sorted positions 'first' such that p + offset is in the sorted positions 'second'.
+    # Both are walked once, side by side. With offset=1 this finds where the first word is directly followed by the
+    # second one.
+    result = []
+    secondIter = iter(second)
+    other = next(secondIter, None)
+    for pos in first:
+        while other is not None and other < pos + offset:
+            other = next(secondIter, None)
+        if other is None:
+            break
+        if other == pos + offset:
+            result.append(pos)
+    return result
+
+
+def shiftPositions(positions, offset):
+    # Return the positions moved forward by offset, in a container of the same kind
+    if offset == 0:
+        return positions
+    if isinstance(positions, PostingList):
+        shifted = PostingList()
+        shifted.extendShifted(positions, offset)
+        return shifted
+    return [pos + offset for pos in positions]
+
+
+def nextTableLength(length):
+    # Find the next table size from PRIMES which is larger than the current one
+    for prime in PRIMES:
+        if prime > length:
+            return prime
+    return length
+
+
+def fittingTableLength(count):
+    # Find the smallest table size from PRIMES which holds count words without going above MAX_LOAD_FACTOR
+    for prime in PRIMES:
+        if count < MAX_LOAD_FACTOR * prime:
+            return prime
+    return PRIMES[-1]
+
+
+def mixHash(hashVal):
+    # Fold the hash value into 32 bits and scramble them (the MurmurHash3 finalizer), so that the low bits used to
+    # pick a slot of a power of two table depend on the whole word and not mostly on its last letters
+    hashVal = (hashVal ^ (hashVal >> 32)) & 0xFFFFFFFF
+    hashVal ^= hashVal >> 16
+    hashVal = (hashVal * 0x85EBCA6B) & 0xFFFFFFFF
+    hashVal ^= hashVal >> 13
+    hashVal = (hashVal * 0xC2B2AE35) & 0xFFFFFFFF
+    hashVal ^= hashVal >> 16
     return hashVal
 
 
+def normalizeWord(word):
+    # The form under which a word is indexed: lower case and without surrounding punctuation
+    return word.strip(PUNCTUATION).lower()
+
+
+def hashWord(key):
+    # Hash value of an already normalized word: its CRC-32 (computed in C instead of a Python loop over the letters)
+    # scrambled by mixHash, so it stays within 32 bits and spreads evenly over any table size
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    return mixHash(zlib.crc32(key) & 0xFFFFFFFF)
+
+
+def generateHashVal(word):
+    return hashWord(normalizeWord(word))
+
+
+def normalizeToken(token):
+    # Return the normalized form of a token and its hash value. Text repeats the same tokens over and over, so the
+    # pair is cached and most tokens are normalized and hashed only once.
+    entry = tokenCache.get(token)
+    if entry is None:
+        if len(tokenCache) >= TOKEN_CACHE_SIZE:
+            tokenCache.clear()
+        key = normalizeWord(token)
+        entry = (key, hashWord(key))
+        tokenCache[token] = entry
+    return entry
+
+
+def hashTokens(tokens):
+    # Bulk version of normalizeToken, returning the (normalized form, hash value) pairs of a whole batch of tokens
+    cached = tokenCache.get
+    result = []
+    for token in tokens:
+        entry = cached(token)
+        if entry is None:
+            entry = normalizeToken(token)
+        result.append(entry)
+    return result
+
+
 # ---------------------------------------------------------------
 # Hash table operations
 # ---------------------------------------------------------------
 
-def increase(key, pos, hashKey):
-    res = find(key, hashKey)
-    if res is not None:
-        res.increment_val(1)
-        res.add_pos(pos)
-        return True
-    return False
 
+# This class stores a hash table of words. Each bucket holds a doubly linked list of nodes, one per distinct word.
+# Once the number of words goes above MAX_LOAD_FACTOR per bucket, a table about twice as big is allocated and the
+# buckets of the old table are moved to it a few at a time (REHASH_STEP per insert or delete), so no single insert
+# has to rehash the whole table. Until a bucket of the old table has been moved, its words are still looked up and
+# inserted there. Likewise, once deletes take the number of words below MIN_LOAD_FACTOR per bucket, the words are
+# moved to the smallest table which holds them within MAX_LOAD_FACTOR, down to the initial size.
+class WordIndex:
+
+    def __init__(self, tableLength=PRIMES[0], postings=list):
+        # 'postings' builds the container for the positions of a word from a list of positions, e.g. PostingList
+        self.postings = postings
+        self.minTableLength = tableLength
+        self.table = [None] * tableLength
+        # The table being emptied into self.table while a resize is in progress
+        self.oldTable = None
+        # Buckets of the old table below this index have been moved already
+        self.rehashIndex = 0
+        self.count = 0
+        # Sorted words for lookupPrefix, built by the first prefix query and kept up to date from then on
+        self.prefixes = None
 
-def find(word, hashKey):
-    global hashTable
+    def __len__(self):
+        return self.count
 
-    currNode = hashTable[hashKey]
-    while currNode.get_val() != -1:
-        if currNode.get_key() == word.lower():
-            return currNode
-        currNode = currNode.get_nxt()
-    return None
+    def getBucket(self, hashVal):
+        # Return the table and the bucket within it which hold the list for this hash value
+        if self.oldTable is not None:
+            hashKey = hashVal % len(self.oldTable)
+            if hashKey >= self.rehashIndex:
+                return self.oldTable, hashKey
+        return self.table, hashVal % len(self.table)
 
+    def rehashStep(self, steps=REHASH_STEP):
+        # Move up to 'steps' buckets of the old table to the new one
+        while self.oldTable is not None and steps > 0:
+            currNode = self.oldTable[self.rehashIndex]
+            while currNode is not None:
+                nxtNode = currNode.get_nxt()
+                self.link(self.table, currNode.get_hash() % len(self.table), currNode)
+                currNode = nxtNode
+            self.oldTable[self.rehashIndex] = None
+            self.rehashIndex += 1
+            steps -= 1
+            if self.rehashIndex == len(self.oldTable):
+                self.oldTable = None
 
-def insert(word, pos):
-    global hashTable
+    def resize(self, tableLength):
+        # Start moving the words to a table with tableLength buckets. Any resize still in progress is finished first.
+        if self.oldTable is not None:
+            self.rehashStep(len(self.oldTable))
+        self.oldTable = self.table
+        self.table = [None] * tableLength
+        self.rehashIndex = 0
 
-    # Generate the hash value for this word
-    hashVal = generateHashVal(word)
+    def link(self, table, hashKey, newNode):
+        # Add the node to the head of the list associated with the bucket
+        newNode.set_prev(None)
+        newNode.set_nxt(table[hashKey])
+        if table[hashKey] is not None:
+            table[hashKey].set_prev(newNode)
+        table[hashKey] = newNode
 
-    # Find the bucket where the word has to be inserted
-    hashKey = hashVal % len(hashTable)
+    def findInBucket(self, key, hashVal, table, hashKey):
+        # Words are compared by their stored hash value first, so the key itself is only compared on a likely match
+        currNode = table[hashKey]
+        while currNode is not None:
+            if currNode.get_hash() == hashVal and currNode.get_key() == key:
+                return currNode
+            currNode = currNode.get_nxt()
+        return None
 
-    # Search for the word at the list associated with the key within the hash table. If we find the word, increment
-    # the count and add the position to the node object. Else create a new node and add it to the head of the list
+    def find(self, word):
+        key, hashVal = normalizeToken(word)
+        table, hashKey = self.getBucket(hashVal)
+        return self.findInBucket(key, hashVal, table, hashKey)
 
-    if increase(word, pos, hashKey):
-        # The word already exists in the text. The count and position has been updated to the list.
-        return True
-    else:
-        # Insert the word at the head of the list associated with the bucket after initializing a node object
-        newWord = node(word, 1, None, None, [pos])
-        # Updating the pointers for current head and new word. The new node is added to the head of the list
-        hashTable[hashKey].set_prev(newWord)
-        newWord.set_nxt(hashTable[hashKey])
-        hashTable[hashKey] = newWord
+    def lookupMany(self, words):
+        # Return the result of find for each of the words, hashing the whole batch before probing the table
+        result = []
+        for key, hashVal in hashTokens(words):
+            table, hashKey = self.getBucket(hashVal)
+            result.append(self.findInBucket(key, hashVal, table, hashKey))
+        return result
+
+    def lookupPrefix(self, prefix, limit=None):
+        # Return the indexed words which start with the (normalized) prefix in sorted order, at most 'limit' of them
+        if self.prefixes is None:
+            self.prefixes = PrefixIndex(key for key, count, positions in self.items())
+        return self.prefixes.lookup(normalizeWord(prefix), limit)
+
+    def insert(self, word, pos):
+        key, hashVal = normalizeToken(word)
+        return self.insertHashed(key, hashVal, pos)
+
+    def insertBatch(self, words, firstPos=1):
+        # Insert a batch of consecutive words, the first of which is at position firstPos, hashing them all up front
+        pos = firstPos
+        for key, hashVal in hashTokens(words):
+            self.insertHashed(key, hashVal, pos)
+            pos += 1
+
+    def insertHashed(self, key, hashVal, pos):
+        self.rehashStep()
+
+        # Search for the word at the list associated with the bucket. If we find the word, increment the count and
+        # add the position to the node object. Else create a new node and add it to the head of the list
+        table, hashKey = self.getBucket(hashVal)
+        wordNode = self.findInBucket(key, hashVal, table, hashKey)
+        if wordNode is not None:
+            wordNode.increment_val(1)
+            wordNode.add_pos(pos)
+            return True
+
+        self.addNode(key, 1, self.postings([pos]), hashVal)
         return True
-    return False
 
+    def addNode(self, key, count, posList, hashVal):
+        # Add a node for a word which is not in the index yet, growing the table first if it is too full
+        if self.oldTable is None and self.count >= MAX_LOAD_FACTOR * len(self.table):
+            self.resize(nextTableLength(len(self.table)))
+        table, hashKey = self.getBucket(hashVal)
+        self.link(table, hashKey, node(key, count, None, None, posList, hashVal))
+        self.count += 1
+        if self.prefixes is not None:
+            self.prefixes.add(key)
+
+    def items(self):
+        # Yield the (word, count, positions) entries of the index in no particular order
+        for table in (self.oldTable, self.table):
+            if table is None:
+                continue
+            for i in range(0, len(table)):
+                currNode = table[i]
+                while currNode is not None:
+                    yield currNode.get_key(), currNode.get_val(), currNode.get_pos()
+                    currNode = currNode.get_nxt()
+
+    def merge(self, entries, offset=0):
+        # Add (word, count, positions) entries, such as the items of another index, to this index, with every position
+        # moved forward by offset. Positions of a word which is already indexed are appended after the ones it has.
+        for key, count, positions in entries:
+            positions = shiftPositions(positions, offset)
+            self.rehashStep()
+            hashVal = hashWord(key)
+            table, hashKey = self.getBucket(hashVal)
+            wordNode = self.findInBucket(key, hashVal, table, hashKey)
+            if wordNode is not None:
+                wordNode.increment_val(count)
+                wordNode.add_positions(positions)
+            else:
+                self.addNode(key, count, self.postings(positions), hashVal)
 
-def delete(key):
-    global hashTable
+    def delete(self, word):
+        self.rehashStep()
 
-    hashVal = generateHashVal(key)
-    hashKey = hashVal % len(hashTable)
-    wordNode = find(key, hashKey)
-    if wordNode is not None:
-        print "Removing '" + wordNode.get_key() + "' from positions: " + str(wordNode.get_pos())
-        # Update the pointers for prev and next node
-        if wordNode.get_prev() is not None:
+        key, hashVal = normalizeToken(word)
+        table, hashKey = self.getBucket(hashVal)
+        wordNode = self.findInBucket(key, hashVal, table, hashKey)
+        if wordNode is None:
+            return False
+        return self.deleteNode(wordNode)
+
+    def deleteNode(self, wordNode):
+        # Remove a node returned by find in O(1). The bucket holding it follows from its stored hash value, so the list
+        # is never searched. A node which was removed already is left alone.
+        table, hashKey = self.getBucket(wordNode.get_hash())
+        if wordNode.get_prev() is None and table[hashKey] is not wordNode:
+            return False
+
+        # Update the pointers for prev and next node, or the bucket itself if the word is at the head of the list
+        if wordNode.get_prev() is None:
+            table[hashKey] = wordNode.get_nxt()
+        else:
             wordNode.get_prev().set_nxt(wordNode.get_nxt())
-        wordNode.get_nxt().set_prev(wordNode.get_prev())
+        if wordNode.get_nxt() is not None:
+            wordNode.get_nxt().set_prev(wordNode.get_prev())
+        wordNode.set_nxt(None)
+        wordNode.set_prev(None)
+        self.count -= 1
+        if self.prefixes is not None:
+            self.prefixes.discard(wordNode.get_key())
+
+        # Shrink straight to the size the remaining words need rather than one step at a time. A resize still in
+        # progress is finished first, which is cheap by then since most of the words it was moving have been deleted.
+        if len(self.table) > self.minTableLength and self.count < MIN_LOAD_FACTOR * len(self.table):
+            tableLength = max(fittingTableLength(self.count), self.minTableLength)
+            if tableLength < len(self.table):
+                self.resize(tableLength)
         return True
-    else:
-        return False
-
-
-def listAllKeys():
-    global hashTable
-    keys = []
-    opFile = open("output.txt", "a+")
-    opFile.write("# ---------------------------------------------------------------\n")
-    opFile.write("# Current state of hash table\n")
-    opFile.write("# ---------------------------------------------------------------\n")
-    for i in range(0, len(hashTable)):
-        currNode = hashTable[i]
-        while currNode.get_val() != -1:
-            keys.append("key: "+currNode.get_key()+", value: "+str(currNode.get_val())+", positions: "+str(currNode.get_pos()))
-            currNode = currNode.get_nxt()
-        print "Current bucket: " + str(i) + ", Entries: " + str(keys)
-        opFile.write("Current bucket: " + str(i) + ", Entries: " + str(keys) + "\n")
+
+    def save(self, fileName):
+        saveSnapshot(self, fileName)
+
+    def listAllKeys(self, fileName="output.txt"):
+        # Finish any resize in progress so that every word is listed under its final bucket
+        if self.oldTable is not None:
+            self.rehashStep(len(self.oldTable))
+
         keys = []
-    opFile.close()
+        opFile = open(fileName, "a+")
+        opFile.write("# ---------------------------------------------------------------\n")
+        opFile.write("# Current state of hash table\n")
+        opFile.write("# ---------------------------------------------------------------\n")
+        for i in range(0, len(self.table)):
+            currNode = self.table[i]
+            while currNode is not None:
+                keys.append("key: "+currNode.get_key()+", value: "+str(currNode.get_val())+", positions: "+str(currNode.get_pos()))
+                currNode = currNode.get_nxt()
+            print "Current bucket: " + str(i) + ", Entries: " + str(keys)
+            opFile.write("Current bucket: " + str(i) + ", Entries: " + str(keys) + "\n")
+            keys = []
+        opFile.close()
+
+
+# This class stores the same index as WordIndex with open addressing (linear probing) instead of linked lists. The
+# table is a set of parallel arrays indexed by slot: the hash value, the word, its count and its positions. A word is
+# stored in the first free slot at or after the slot picked by its hash, so a lookup scans a short run of adjacent
+# slots instead of following pointers, and no object is allocated per word or per empty bucket. Deletes shift the
+# following words of the run back instead of leaving markers behind. The number of slots is a power of two and
+# doubles whenever more than MAX_OPEN_LOAD_FACTOR of them are occupied, and halves (down to the initial size) whenever
+# deletes leave less than MIN_OPEN_LOAD_FACTOR of them occupied.
+class OpenWordIndex:
+
+    def __init__(self, tableLength=64, postings=list):
+        self.postings = postings
+        slots = 1
+        while slots < tableLength:
+            slots *= 2
+        self.minSlots = slots
+        self.allocate(slots)
+        self.count = 0
+        self.prefixes = None
+
+    def __len__(self):
+        return self.count
+
+    def allocate(self, slots):
+        self.mask = slots - 1
+        self.hashes = array("I", [0]) * slots
+        self.keys = [None] * slots
+        self.counts = array("l", [0]) * slots
+        self.positions = [None] * slots
+
+    def findSlot(self, key, hashVal):
+        # Return the slot holding the key, or the free slot where it would go
+        keys = self.keys
+        hashes = self.hashes
+        i = hashVal & self.mask
+        while keys[i] is not None:
+            if hashes[i] == hashVal and keys[i] == key:
+                return i
+            i = (i + 1) & self.mask
+        return i
+
+    def resize(self, slots):
+        hashes = self.hashes
+        keys = self.keys
+        counts = self.counts
+        positions = self.positions
+        self.allocate(slots)
+        for i in range(0, len(keys)):
+            if keys[i] is not None:
+                j = self.findSlot(keys[i], hashes[i])
+                self.hashes[j] = hashes[i]
+                self.keys[j] = keys[i]
+                self.counts[j] = counts[i]
+                self.positions[j] = positions[i]
+
+    def find(self, word):
+        # Return a node holding the word, its count and its positions, or None if the word is not in the index. The
+        # node is built for the caller and is not part of the table.
+        key, hashVal = normalizeToken(word)
+        i = self.findSlot(key, hashVal)
+        if self.keys[i] is None:
+            return None
+        return node(key, self.counts[i], None, None, self.positions[i], hashVal)
+
+    def lookupMany(self, words):
+        result = []
+        for key, hashVal in hashTokens(words):
+            i = self.findSlot(key, hashVal)
+            if self.keys[i] is None:
+                result.append(None)
+            else:
+                result.append(node(key, self.counts[i], None, None, self.positions[i], hashVal))
+        return result
+
+    def lookupPrefix(self, prefix, limit=None):
+        if self.prefixes is None:
+            self.prefixes = PrefixIndex(key for key in self.keys if key is not None)
+        return self.prefixes.lookup(normalizeWord(prefix), limit)
+
+    def insert(self, word, pos):
+        key, hashVal = normalizeToken(word)
+        return self.insertHashed(key, hashVal, pos)
+
+    def insertBatch(self, words, firstPos=1):
+        pos = firstPos
+        for key, hashVal in hashTokens(words):
+            self.insertHashed(key, hashVal, pos)
+            pos += 1
+
+    def insertHashed(self, key, hashVal, pos):
+        i = self.findSlot(key, hashVal)
+        if self.keys[i] is not None:
+            self.counts[i] += 1
+            self.positions[i].append(pos)
+            return True
+
+        self.addEntry(i, key, 1, self.postings([pos]), hashVal)
+        return True
+
+    def addEntry(self, i, key, count, positions, hashVal):
+        # Store a word which is not in the index yet at the free slot i, growing the table first if it is too full
+        if self.count + 1 > MAX_OPEN_LOAD_FACTOR * (self.mask + 1):
+            self.resize(2 * (self.mask + 1))
+            i = self.findSlot(key, hashVal)
+        self.hashes[i] = hashVal
+        self.keys[i] = key
+        self.counts[i] = count
+        self.positions[i] = positions
+        self.count += 1
+        if self.prefixes is not None:
+            self.prefixes.add(key)
+
+    def items(self):
+        for i in range(0, self.mask + 1):
+            if self.keys[i] is not None:
+                yield self.keys[i], self.counts[i], self.positions[i]
+
+    def merge(self, entries, offset=0):
+        for key, count, positions in entries:
+            positions = shiftPositions(positions, offset)
+            hashVal = hashWord(key)
+            i = self.findSlot(key, hashVal)
+            if self.keys[i] is not None:
+                self.counts[i] += count
+                self.positions[i].extend(positions)
+            else:
+                self.addEntry(i, key, count, self.postings(positions), hashVal)
+
+    def delete(self, word):
+        key, hashVal = normalizeToken(word)
+        i = self.findSlot(key, hashVal)
+        if self.keys[i] is None:
+            return False
+        self.deleteSlot(i)
+        return True
+
+    def deleteSlot(self, i):
+        key = self.keys[i]
+
+        # Walk the rest of the run and move back every word whose home slot is not between the hole and itself, so
+        # that no lookup ever stops early at the hole
+        j = i
+        while True:
+            j = (j + 1) & self.mask
+            if self.keys[j] is None:
+                break
+            home = self.hashes[j] & self.mask
+            if (i < j and i < home <= j) or (i > j and (home > i or home <= j)):
+                continue
+            self.hashes[i] = self.hashes[j]
+            self.keys[i] = self.keys[j]
+            self.counts[i] = self.counts[j]
+            self.positions[i] = self.positions[j]
+            i = j
+
+        self.keys[i] = None
+        self.positions[i] = None
+        self.counts[i] = 0
+        self.hashes[i] = 0
+        self.count -= 1
+        if self.prefixes is not None:
+            self.prefixes.discard(key)
+
+        slots = self.mask + 1
+        if slots > self.minSlots and self.count < MIN_OPEN_LOAD_FACTOR * slots:
+            self.resize(slots // 2)
+
+    def save(self, fileName):
+        saveSnapshot(self, fileName)
+
+    def listAllKeys(self, fileName="output.txt"):
+        opFile = open(fileName, "a+")
+        opFile.write("# ---------------------------------------------------------------\n")
+        opFile.write("# Current state of hash table\n")
+        opFile.write("# ---------------------------------------------------------------\n")
+        for i in range(0, self.mask + 1):
+            if self.keys[i] is not None:
+                entry = "key: "+self.keys[i]+", value: "+str(self.counts[i])+", positions: "+str(self.positions[i])
+                print "Current slot: " + str(i) + ", Entry: " + entry
+                opFile.write("Current slot: " + str(i) + ", Entry: " + entry + "\n")
+        opFile.close()
 
 
 # ---------------------------------------------------------------
-# Main Function
+# Snapshots
 # ---------------------------------------------------------------
 
-def main():
-    global hashTable
+def saveSnapshot(index, fileName):
+    # Write the entries of an index to a binary file which IndexSnapshot can query in place. All numbers are little
+    # endian. The file is laid out as:
+    # header - SNAPSHOT_MAGIC, SNAPSHOT_VERSION, number of buckets (a power of two), number of words
+    # offsets - for every bucket, the file offsets where its entries start and end
+    # entries - the words grouped by bucket (hash value & (buckets - 1)), each one written as its hash value, key
+    #           length, length of the encoded positions, count and last position, followed by the key and the
+    #           positions encoded as in PostingList
+    bucketCount = 1
+    while bucketCount < len(index):
+        bucketCount *= 2
+    buckets = [[] for i in range(0, bucketCount)]
+    for key, count, positions in index.items():
+        hashVal = hashWord(key)
+        buckets[hashVal & (bucketCount - 1)].append((hashVal, key, count, positions))
+
+    opFile = open(fileName, "wb")
+    try:
+        opFile.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, bucketCount, len(index)))
+        offsetsStart = opFile.tell()
+        opFile.write("\0" * (SNAPSHOT_OFFSETS.size * bucketCount))
+        offsets = []
+        for bucket in buckets:
+            start = opFile.tell()
+            for hashVal, key, count, positions in bucket:
+                if isinstance(key, unicode):
+                    key = key.encode("utf-8")
+                if not isinstance(positions, PostingList):
+                    positions = PostingList(positions)
+                encoded = positions.encoded()
+                opFile.write(SNAPSHOT_ENTRY.pack(hashVal, len(key), len(encoded), count, positions.last))
+                opFile.write(key)
+                opFile.write(encoded)
+            offsets.append(SNAPSHOT_OFFSETS.pack(start, opFile.tell()))
+        opFile.seek(offsetsStart)
+        opFile.write("".join(offsets))
+    finally:
+        opFile.close()
+
+
+# This class answers queries straight from a file written by saveSnapshot. The file is memory mapped, so opening it
+# reads nothing but the header, and a lookup only touches the offsets of one bucket and the entries within it. The
+# positions of a word are decoded only when they are iterated.
+class IndexSnapshot:
+
+    def __init__(self, fileName):
+        self.file = open(fileName, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.bucketCount, self.count = SNAPSHOT_HEADER.unpack_from(self.data, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(fileName + " is not a word index snapshot (version " + str(SNAPSHOT_VERSION) + ")")
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def readEntry(self, offset):
+        # Return the key, count and positions of the entry at this offset, and the offset of the next entry
+        hashVal, keyLength, positionsLength, count, last = SNAPSHOT_ENTRY.unpack_from(self.data, offset)
+        keyStart = offset + SNAPSHOT_ENTRY.size
+        positions = PostingList()
+        positions.setEncoded(self.data[keyStart + keyLength:keyStart + keyLength + positionsLength], count, last)
+        return self.data[keyStart:keyStart + keyLength], count, positions, keyStart + keyLength + positionsLength
+
+    def find(self, word):
+        # Return a node holding the word, its count and its positions, or None if the word is not in the snapshot
+        key, hashVal = normalizeToken(word)
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+        bucket = hashVal & (self.bucketCount - 1)
+        offset, end = SNAPSHOT_OFFSETS.unpack_from(self.data, SNAPSHOT_HEADER.size + SNAPSHOT_OFFSETS.size * bucket)
+        while offset < end:
+            entryHash, keyLength, positionsLength, count, last = SNAPSHOT_ENTRY.unpack_from(self.data, offset)
+            keyStart = offset + SNAPSHOT_ENTRY.size
+            if entryHash == hashVal and self.data[keyStart:keyStart + keyLength] == key:
+                key, count, positions, offset = self.readEntry(offset)
+                return node(key, count, None, None, positions, hashVal)
+            offset = keyStart + keyLength + positionsLength
+        return None
+
+    def items(self):
+        offset = SNAPSHOT_HEADER.size + SNAPSHOT_OFFSETS.size * self.bucketCount
+        for i in range(0, self.count):
+            key, count, positions, offset = self.readEntry(offset)
+            yield key, count, positions
+
+
+# ---------------------------------------------------------------
+# Input processing
+# ---------------------------------------------------------------
+
+def readChunks(fileName, chunkSize=CHUNK_SIZE, useMmap=False, start=0, end=None):
+    # Yield the bytes of the file from start up to end (the end of the file by default) chunkSize bytes at a time,
+    # either read into a buffer or sliced from a memory mapped copy of the file
+    textFile = open(fileName, "rb")
+    try:
+        textFile.seek(0, 2)
+        if end is None or end > textFile.tell():
+            end = textFile.tell()
+        if start >= end:
+            return
+        if not useMmap:
+            textFile.seek(start)
+            while start < end:
+                chunk = textFile.read(min(chunkSize, end - start))
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+        else:
+            data = mmap.mmap(textFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for chunkStart in range(start, end, chunkSize):
+                    yield data[chunkStart:min(chunkStart + chunkSize, end)]
+            finally:
+                data.close()
+    finally:
+        textFile.close()
+
 
-    # Process the input file and find the hash table size
-    text_file = open("ip.txt", "r")
-    text_lines = text_file.readlines()
-    text_file.close()
-    text = ' '.join(text_lines).split()
-    tableLength = getTableLength(len(text))
+def iterTokenBatches(fileName, chunkSize=CHUNK_SIZE, useMmap=False, start=0, end=None, firstPos=1):
+    # Yield the whitespace separated words of the file (or of the bytes from start to end) a chunk at a time, as a
+    # list of words together with the position of the first one, counting from firstPos. A word cut by the end of a
+    # chunk is held back and completed with the start of the next one.
+    pos = firstPos
+    leftover = ""
+    for chunk in readChunks(fileName, chunkSize, useMmap, start, end):
+        chunk = leftover + chunk
+        words = chunk.split()
+        leftover = ""
+        if words and not chunk[-1].isspace():
+            leftover = words.pop()
+        if words:
+            yield words, pos
+            pos += len(words)
+    if leftover:
+        yield [leftover], pos
 
-    # Initialize the hash table
-    # Each index is initialized with an empty node which stays at the end of the list as it expands
-    hashTable = [node(None, -1, None, None, -1) for i in range(0, tableLength)]
 
-    # Insert each word from the input text into hash table
-    for i in range(1, len(text) + 1):
-        insert(text[i - 1], i)
+def iterTokens(fileName, chunkSize=CHUNK_SIZE, useMmap=False, start=0, end=None, firstPos=1):
+    # Yield every word of the file along with its position, see iterTokenBatches
+    for words, pos in iterTokenBatches(fileName, chunkSize, useMmap, start, end, firstPos):
+        for word in words:
+            yield word, pos
+            pos += 1
+
+
+def indexFile(fileName, index=None, chunkSize=CHUNK_SIZE, useMmap=False):
+    # Insert every word of the file into the index (a new WordIndex if none is given) as the file is read, so memory
+    # use is bounded by the index and a single chunk, and return the index
+    if index is None:
+        index = WordIndex()
+    for words, pos in iterTokenBatches(fileName, chunkSize, useMmap):
+        index.insertBatch(words, pos)
+    return index
+
+
+def shardRanges(fileName, shards):
+    # Split the file into about 'shards' byte ranges of similar size. Every range but the last ends right before a
+    # whitespace character, so no word is split between two ranges.
+    size = os.path.getsize(fileName)
+    bounds = [0]
+    textFile = open(fileName, "rb")
+    try:
+        for k in range(1, shards):
+            bound = max(k * size // shards, bounds[-1])
+            textFile.seek(bound)
+            while bound < size:
+                block = textFile.read(4096)
+                found = [i for i in range(0, len(block)) if block[i].isspace()]
+                if found:
+                    bound += found[0]
+                    break
+                bound += len(block)
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    finally:
+        textFile.close()
+    if bounds[-1] < size:
+        bounds.append(size)
+    return [(bounds[k], bounds[k + 1]) for k in range(0, len(bounds) - 1)]
+
+
+def indexShard(shard):
+    # Index one byte range of the file into a partial index, counting positions from the start of the range, and
+    # return its entries along with the number of words in the range
+    fileName, start, end, postings = shard
+    index = WordIndex(postings=postings)
+    count = 0
+    for words, pos in iterTokenBatches(fileName, CHUNK_SIZE, False, start, end):
+        index.insertBatch(words, pos)
+        count += len(words)
+    return list(index.items()), count
+
+
+def indexFileParallel(fileName, index=None, processes=None):
+    # Build the same index as indexFile using a pool of worker processes. The file is split into one byte range per
+    # worker and every range is indexed into a partial index with positions counted from its start. The partial
+    # indexes are merged in file order as they come in, moving their positions forward by the number of words in the
+    # ranges before them, so each position list stays sorted.
+    if index is None:
+        index = WordIndex()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    ranges = shardRanges(fileName, processes)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        shards = [(fileName, start, end, index.postings) for start, end in ranges]
+        offset = 0
+        for entries, count in pool.imap(indexShard, shards):
+            index.merge(entries, offset)
+            offset += count
+    finally:
+        pool.close()
+        pool.join()
+    return index
+
+
+# ---------------------------------------------------------------
+# Main Function
+# ---------------------------------------------------------------
+
+def main():
+    # Insert each word from the input text into hash table while the file is read
+    index = indexFile("ip.txt")
 
     # Listing all the keys in the table
     print "# ---------------------------------------------------------------"
     print "# After initialization"
     print "# ---------------------------------------------------------------"
-    listAllKeys()
+    index.listAllKeys()
 
     # Deleting a key
     #keyToBeRemoved = "But"
     #print "# ---------------------------------------------------------------"
     #print "# Deleting '" + keyToBeRemoved + "' from the hash table"
     #print "# ---------------------------------------------------------------"
-    #if delete(keyToBeRemoved):
+    #if index.delete(keyToBeRemoved):
     #    print "All instances of '" + keyToBeRemoved + "' were removed successfully!"
     #    # Listing all the keys in the table again
-    #    listAllKeys()
+    #    index.listAllKeys()
     #else:
     #    print "No instances found for '" + keyToBeRemoved + "'!"
 